@@ -1,24 +1,136 @@
-from flask import Flask, jsonify, request, send_file
+from flask import Flask, jsonify, request, send_file, redirect, Response, stream_with_context
 from flask_cors import CORS
+import numpy as np
 import pandas as pd
 import joblib
-import random
 import time
 import threading
 import os
 import re
+import sys
+from collections import OrderedDict
+from urllib.parse import urlsplit
 
 # Your modules
-from history_logger import log_threat, fetch_threat_history, fetch_history, log_patch
+from history_logger import log_threats, fetch_threat_history, fetch_history, log_patch, log_patches, migrate_db, next_cursor
 from whisper_tts import transcribe_audio, generate_speech
-from transformers import GPT2LMHeadModel, GPT2TokenizerFast, pipeline
 from test_g import getResponse
+from explanation_queue import ExplanationQueue
+from explanation_cache import ExplanationCache, frame_signature
+from attack_templates import TRAINED_LABELS, UNIDENTIFIED_ATTACK, get_template
+from can_parser import FEATURE_COLUMNS
+from window_features import WINDOW_COLUMNS, WindowFeatureEngine
+from lazy_resource import LazyResource
+from onnx_backend import ANOMALY_ONNX, GPT_ONNX, onnxruntime_available
+from forest_scorer import FlatIsolationForest
+from thresholds import ThresholdTable, NORMAL, SUSPECT, OUTLIER
+from patch_catalog import encode_patch_to_can, resolve_patch_id
+from model_registry import CURRENT, artifact_mtime, artifact_path, list_versions
+from sklearn.ensemble import IsolationForest
+from event_bus import EventBus, format_event, sse_stream
+from fleet_state import FleetStateStore
+from shared_state import SharedEventBus, SharedFleetState, SharedTicketStore, init_shared_state
+from can_simulator import generate_can_data
+from instrumentation import metrics, span, get_logger
+
+logger = get_logger("app")
+
+# "eager": load every model at import (old behaviour)
+# "warm":  start serving at once and load models in a background thread
+# "lazy":  load each model on first use
+STARTUP_MODE = os.environ.get("STARTUP_MODE", "warm")
+
+# Micro-batching settings for model.generate
+GENERATION_MAX_BATCH = 16
+GENERATION_MAX_WAIT_MS = 10
+
+# "template": score the trained Attack Type labels in one forward pass and
+# answer from attack_templates; "generate": sample the full answer
+EXPLAIN_MODE = os.environ.get("EXPLAIN_MODE", "template")
+
+# "auto": score the IsolationForest with the flattened NumPy trees
+# (forest_scorer, exact) and use onnxruntime for the GPT classifier when
+# export_onnx.py has written it; "onnx": require the ONNX artifacts;
+# "native": always use sklearn / PyTorch
+INFERENCE_BACKEND = os.environ.get("INFERENCE_BACKEND", "auto")
+
+# Seconds between checks for a newly promoted model file (0 disables);
+# a change is loaded in the background and swapped in without a restart
+MODEL_WATCH_INTERVAL = float(os.environ.get("MODEL_WATCH_INTERVAL", 10))
+
+# "memory": fleet state, explanation tickets and /stream events live in this
+# process; "sqlite": they live in the threats database, so every gunicorn
+# worker sees all of them (gunicorn.conf.py sets this for several workers)
+STATE_BACKEND = os.environ.get("STATE_BACKEND", "memory")
+
+
+def use_onnx(artifact):
+    if INFERENCE_BACKEND == "onnx":
+        return True
+    return INFERENCE_BACKEND == "auto" and os.path.exists(artifact) and onnxruntime_available()
+
+
+def load_gpt(version=None):
+    """Load a fine-tuned distilgpt2 version (default: the served one) and the services built on it."""
+    # Imported here so transformers/torch do not slow down process start
+    from transformers import GPT2LMHeadModel, GPT2TokenizerFast
+    from generation_batcher import GenerationBatcher
+    from attack_classifier import AttackClassifier
+
+    # Load model and tokenizer the Hugging Face way
+    model_path = artifact_path("distilgpt2", version)
+    tokenizer = GPT2TokenizerFast.from_pretrained(model_path)
+    model = GPT2LMHeadModel.from_pretrained(model_path)
+    model.eval()
+
+    # The classifier only needs forward passes, which the int8 ONNX graph
+    # covers; the graph is exported from the served model only
+    if version in (None, CURRENT) and use_onnx(GPT_ONNX):
+        from onnx_backend import OnnxCausalLM
+        classifier_model, backend = OnnxCausalLM(GPT_ONNX), "onnx"
+    else:
+        classifier_model, backend = model, "native"
+
+    return {
+        "tokenizer": tokenizer,
+        "model": model,
+        "generator": GenerationBatcher(model, tokenizer, max_batch_size=GENERATION_MAX_BATCH, max_wait_ms=GENERATION_MAX_WAIT_MS),
+        "classifier": AttackClassifier(classifier_model, tokenizer),
+        "backend": backend
+    }
+
 
-# Load model and tokenizer the Hugging Face way
-model_path = "./model/fine_tuned_distilgpt2"
-tokenizer = GPT2TokenizerFast.from_pretrained(model_path)
-model = GPT2LMHeadModel.from_pretrained(model_path)
-gpt2_pipeline = pipeline("text-generation", model=model, tokenizer=tokenizer)
+def load_anomaly_model(version=None):
+    """Load an IsolationForest version (default: the served one) and the feature layout it was trained on."""
+    # model = joblib.load("./model/random_forest_model.pkl")
+    model_path = artifact_path("anomaly_model", version)
+    if INFERENCE_BACKEND == "onnx" and version in (None, CURRENT):
+        from onnx_backend import OnnxIsolationForest
+        anomaly_model, backend = OnnxIsolationForest(ANOMALY_ONNX), "onnx"
+    else:
+        anomaly_model, backend = joblib.load(model_path), "native"
+        if INFERENCE_BACKEND == "auto" and isinstance(anomaly_model, IsolationForest):
+            anomaly_model, backend = FlatIsolationForest(anomaly_model), "numpy"
+
+    # Models trained with train_model.USE_WINDOW_FEATURES also expect the
+    # per-CAN-ID window statistics, kept per vehicle in window_engines
+    columns = list(getattr(anomaly_model, "feature_names_in_", FEATURE_COLUMNS))
+    return {
+        "model": anomaly_model,
+        "columns": columns,
+        "use_window_features": all(column in columns for column in WINDOW_COLUMNS),
+        "backend": backend
+    }
+
+
+def release_gpt(old):
+    """After a swap, let the old batcher finish its queue and stop its thread."""
+    old["generator"].close()
+
+
+gpt = LazyResource("distilgpt2", load_gpt, release=release_gpt)
+detector = LazyResource("anomaly_model", load_anomaly_model)
+MODELS = {resource.name: resource for resource in (detector, gpt)}
 
 UPLOAD_FOLDER = os.path.join(os.path.dirname(__file__), "..", "data")
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
@@ -26,15 +138,76 @@ os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 app = Flask(__name__)
 CORS(app, resources={r"/*": {"origins": "*"}})
 
-# Load trained anomaly detection model
-# model = joblib.load("./model/random_forest_model.pkl")
-anomaly_model = joblib.load("./model/anomaly_model.pkl")
+# Create tables, add indexes and backfill epoch timestamps if needed
+migrate_db()
+if STATE_BACKEND == "sqlite":
+    init_shared_state()
+
+# Per-vehicle window feature state, used when the anomaly model expects it;
+# the least recently seen vehicle is dropped past WINDOW_MAX_VEHICLES
+WINDOW_MAX_VEHICLES = 10000
+window_engines = OrderedDict()  # vehicle_id -> WindowFeatureEngine
+window_lock = threading.Lock()
+
+# Background GPT explanation pool settings (one worker per batch slot)
+EXPLAIN_WORKERS = GENERATION_MAX_BATCH
+EXPLAIN_QUEUE_SIZE = 256
+
+# Explanation cache settings (bucket=1 keys on the exact payload)
+EXPLAIN_CACHE_SIZE = 4096
+EXPLAIN_CACHE_TTL = 3600
+EXPLAIN_CACHE_BUCKET = 1
+
+# Latest frame, rolling health and last verdict per vehicle
+SIMULATED_VEHICLE = "Vehicle_001"
+# Held by the one worker process that runs the simulator (see start_simulator)
+SIMULATOR_LOCK = "../logs/simulator.lock"
 
-# Global vehicle data
-current_vehicle_data = {}
+fleet = SharedFleetState() if STATE_BACKEND == "sqlite" else FleetStateStore()
 
-# Generate random simulated CAN data
-import random
+# Per-vehicle / per-CAN-ID score thresholds, re-read when the file changes
+THRESHOLDS_FILE = "./thresholds.json"
+
+# Live updates for /stream subscribers (detections, threats, patches, vehicle frames)
+event_bus = SharedEventBus() if STATE_BACKEND == "sqlite" else EventBus()
+# Port of the asyncio /stream server once init_worker has started it, and
+# the public URL browsers are sent to for it when a proxy exposes it elsewhere
+stream_port = None
+stream_public_url = None
+THREAT_FIELDS = ("vehicle_id", "anomaly_score", "attack", "gpt_explanation", "suggested_patch", "is_anomaly")
+
+thresholds = ThresholdTable(THRESHOLDS_FILE)
+
+# Logged for anomalies too close to the threshold to be worth a GPT call
+SUSPECT_RESULT = (
+    "Suspected anomaly",
+    "Score is close to the anomaly threshold; logged without a GPT explanation.",
+    "No patch suggested."
+)
+
+
+def record_threats(rows):
+    """
+    Log (vehicle_id, anomaly_score, attack, gpt_explanation, suggested_patch,
+    is_anomaly) rows and push them to /stream. anomaly_score is the
+    continuous decision_function score.
+    """
+    with span("db_enqueue"):
+        log_threats(rows)
+    anomalies = sum(1 for row in rows if row[5])
+    metrics.increment("detections_total", anomalies, "Frames scored", result="anomaly")
+    metrics.increment("detections_total", len(rows) - anomalies, "Frames scored", result="normal")
+    if not event_bus.has_subscribers():
+        return
+
+    # Same shape as /history rows, with the timestamp format datetime('now') uses
+    timestamp = time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime())
+    events = [{"timestamp": timestamp, **dict(zip(THREAT_FIELDS, row))} for row in rows]
+    event_bus.publish("history", events)
+
+    threats = [event for event in events if event["is_anomaly"]]
+    if threats:
+        event_bus.publish("threat", threats)
 
 #parse the gpt output
 def parse_g_output(output):
@@ -99,121 +272,236 @@ def parse_gpt_output(output_text):
         "patch": patch_match.group(1).strip() if patch_match else "No patch suggested."
     }
 
-# Function to encode patch text into CAN byte-style format
-def encode_patch_to_can(patch_text):
-    patch_text = patch_text.lower()
 
-    if "ids" in patch_text and "monitor" in patch_text:
-        return {
-            "byte_0": 0x02,  # ENABLE_IDS
-            "byte_1": 0xB1,  # CAN_MONITOR
-            "byte_2": 0x01,  # ACTIVE_MONITORING
-            "byte_3": 0x00,
-            "byte_4": 0x00,
-            "byte_5": 0x00,
-            "byte_6": 0x00,
-            "byte_7": 0x00
-        }
-
-    elif "security update" in patch_text and "overload" in patch_text:
-        return {
-            "byte_0": 0x03,  # THROTTLING MODE
-            "byte_1": 0xA2,  # NETWORK CONTROL MODULE
-            "byte_2": 0x02,  # OVERLOAD HANDLER
-            "byte_3": 0x00,
-            "byte_4": 0x00,
-            "byte_5": 0x00,
-            "byte_6": 0x00,
-            "byte_7": 0x00
-        }
-
-    elif "data validity" in patch_text:
-        return {
-            "byte_0": 0x04,  # VALIDATION MODULE
-            "byte_1": 0xC3,
-            "byte_2": 0x01,
-            "byte_3": 0x00,
-            "byte_4": 0x00,
-            "byte_5": 0x00,
-            "byte_6": 0x00,
-            "byte_7": 0x00
-        }
-
-    elif "id verification" in patch_text:
-        return {
-            "byte_0": 0x05,  # AUTH MODULE
-            "byte_1": 0xD4,
-            "byte_2": 0x01,
-            "byte_3": 0x00,
-            "byte_4": 0x00,
-            "byte_5": 0x00,
-            "byte_6": 0x00,
-            "byte_7": 0x00
-        }
+@span("features")
+def build_feature_matrix(frames, loaded):
+    """
+    Turn a list of CAN frame dicts into one float matrix in the column order
+    of `loaded` (a detector.get() value, fetched once per request so a model
+    swap cannot change it mid-request).
+    Missing payload bytes default to 0, like in /detect. With window
+    features, each frame also updates its vehicle's rolling per-ID state
+    from its "timestamp" (seconds). A single frame may omit it and uses its
+    arrival time; in a batch every frame needs one, because frames stamped
+    with one arrival time would all have a zero inter-arrival time.
+    """
+    columns = loaded["columns"]
+    matrix = np.zeros((len(frames), len(columns)), dtype=np.float64)
+    base = len(FEATURE_COLUMNS)
+    for row, frame in enumerate(frames):
+        matrix[row, 0] = frame["can_id"]
+        matrix[row, 1] = frame["dlc"]
+        matrix[row, 2:base] = [frame.get(f"byte_{i}", 0) for i in range(8)]
+
+    if loaded["use_window_features"]:
+        if len(frames) > 1 and any("timestamp" not in frame for frame in frames):
+            raise ValueError("Every frame needs a timestamp (seconds) when the anomaly model uses window features.")
+        now = time.time()
+        with window_lock:
+            for row, frame in enumerate(frames):
+                vehicle_id = frame.get("vehicle_id", "Vehicle_001")
+                engine = window_engines.get(vehicle_id)
+                if engine is None:
+                    engine = window_engines[vehicle_id] = WindowFeatureEngine()
+                    if len(window_engines) > WINDOW_MAX_VEHICLES:
+                        window_engines.popitem(last=False)
+                else:
+                    window_engines.move_to_end(vehicle_id)
+                matrix[row, base:] = engine.update(frame["can_id"], frame.get("timestamp", now), matrix[row, 2:base])
+
+    return matrix
+
+
+def score_frames(matrix, loaded):
+    """
+    Score a whole feature matrix with a single decision_function call.
+    Returns the continuous scores (lower = more anomalous); the threshold
+    table turns them into tiers.
+    """
+    with span("anomaly_predict"):
+        # Only sklearn needs a DataFrame (it checks feature names)
+        if loaded["backend"] == "native":
+            matrix = pd.DataFrame(matrix, columns=loaded["columns"], copy=False)
+        scores = loaded["model"].decision_function(matrix)
+    return scores
 
-    # Default: fallback — encode first 8 characters
-    return {f"byte_{i}": ord(c) % 256 for i, c in enumerate(patch_text[:8])}
-
-
-def generate_can_data():
-    # 70% chance of healthy, 30% chance of anomaly
-    is_healthy = random.random() < 0.7
-
-    if is_healthy:
-        data = {
-            "vehicle_id": f"Vehicle_001",
-            "can_id": random.randint(0x100, 0x7FF),
-            "dlc": random.randint(1, 8),
-            "byte_0": random.randint(800, 3000),     # RPM
-            "byte_1": random.randint(0, 60),         # Throttle %
-            "byte_2": random.randint(0, 100),        # Brake Pressure
-            "byte_3": random.randint(-20, 20),       # Steering Angle
-            "byte_4": random.randint(0, 120),        # Speed km/h
-            "byte_5": random.randint(30, 80),        # Fuel %
-            "byte_6": round(random.uniform(11.5, 13.5), 2),  # Battery Voltage
-            "byte_7": random.randint(1, 5),          # Gear
-        }
-    else:
-        data = {
-            "vehicle_id": f"Vehicle_001",
-            "can_id": random.randint(0x100, 0x7FF),
-            "dlc": random.randint(1, 8),
-            "byte_0": random.randint(7000, 9000),    # High RPM
-            "byte_1": random.randint(90, 100),       # Throttle maxed
-            "byte_2": random.randint(200, 255),      # Brake to max
-            "byte_3": random.randint(-90, 90),       # Wild steering
-            "byte_4": random.randint(180, 250),      # Over-speeding
-            "byte_5": random.randint(0, 5),          # Fuel nearly empty
-            "byte_6": round(random.uniform(5.0, 9.0), 2),   # Low battery
-            "byte_7": random.randint(5, 6),          # High gear at low speed
-        }
-    return data
-
-
-# def generate_can_data():
-#     # Example CAN data generation
-#     return {
-#         "vehicle_id": "Vehicle_001",
-#         "can_id": 450,
-#         "dlc": 8,
-#         "byte_0": 200,
-#         "byte_1": 255,
-#         "byte_2": 200,
-#         "byte_3": 250,
-#         "byte_4": 17,
-#         "byte_5": 223,
-#         "byte_6": 125,
-#         "byte_7": 160,
-#     }
-    
 
 # Background thread to simulate real-time CAN data
 def update_vehicle_data():
-    global current_vehicle_data
     while True:
-        current_vehicle_data = generate_can_data()
+        frame = generate_can_data(SIMULATED_VEHICLE)
+        fleet.update(frame["vehicle_id"], frame)
+        event_bus.publish("vehicle", frame)
         time.sleep(20)
 
+def start_simulator(exclusive=False):
+    """
+    Start the CAN simulation thread. With exclusive=True (several worker
+    processes) only the worker holding SIMULATOR_LOCK runs it; if that
+    worker exits, the lock is released and a waiting worker takes over.
+    """
+    def run():
+        if exclusive:
+            import fcntl
+            lock_file = open(SIMULATOR_LOCK, "w")
+            fcntl.flock(lock_file, fcntl.LOCK_EX)  # blocks until this worker is the leader
+            logger.info("Worker %s runs the CAN simulator", os.getpid())
+        update_vehicle_data()
+
+    threading.Thread(target=run, name="can-simulator", daemon=True).start()
+
+def init_worker(workers, stream_bind=None, public_url=None):
+    """
+    Called by gunicorn after fork: share the CPU cores between workers,
+    start the background threads and, with stream_bind ("host:port"),
+    serve /stream from the asyncio server in sse_server. public_url, if
+    set, is where /stream on the main port redirects browsers to.
+    """
+    global stream_port, stream_public_url
+    torch = sys.modules.get("torch")
+    if torch is not None:
+        torch.set_num_threads(max(1, (os.cpu_count() or 1) // workers))
+    start_simulator(exclusive=workers > 1)
+    start_model_watcher()
+
+    if stream_bind:
+        from sse_server import start_sse_server
+        host, _, port = stream_bind.rpartition(":")
+        try:
+            start_sse_server(event_bus, host or "0.0.0.0", int(port))
+            stream_port = int(port)
+            stream_public_url = public_url
+        except OSError as e:
+            logger.error("Cannot serve /stream on %s (%s); serving it from the WSGI threads", stream_bind, e)
+
+# The fine-tuned answer is complete once the "Suggested Patch:" line ends
+PATCH_LINE = re.compile(r"(?i)suggested\s*patch\s*:[^\n]*\S[^\n]*\n")
+
+EXPLAIN_GENERATE_KWARGS = {
+    "max_new_tokens": 64,  # explanation + patch lines are ~40 tokens
+    "do_sample": True,
+    "top_k": 50,
+    "temperature": 0.9,
+    "repetition_penalty": 1.2,
+    "stop_pattern": PATCH_LINE,
+    "new_tokens_only": True
+}
+
+def explain_anomaly(can_id, dlc, bytes_list):
+    """
+    Ask the fine-tuned GPT-2 to classify and explain an anomalous frame.
+    The attack type is always scored against the trained labels. In
+    template mode (and for an unidentified attack) the text comes from the
+    template table; otherwise the prompt is extended with
+    "Attack Type: <label>\nExplanation:" and only the explanation and patch
+    lines are sampled, stopping after the patch line. Sampling is retried
+    once if a field is missing.
+    Returns (attack, gpt_explanation, patch).
+    """
+    # Initial GPT prompt
+    prompt = f"CAN ID: {can_id}, DLC: {dlc}, Data: {bytes_list}"
+    logger.debug("Prompt for GPT-2: %s", prompt)
+
+    loaded = gpt.get()  # one version for the whole explanation
+    # Batched with concurrent classifications on the generation thread
+    label = loaded["generator"].classify(prompt, loaded["classifier"])
+    attack = TRAINED_LABELS.get(label, label)
+    if EXPLAIN_MODE == "template" or attack == UNIDENTIFIED_ATTACK:
+        gpt_explanation, patch = get_template(attack)
+        return attack, gpt_explanation, patch
+
+    # Force the answer layout and sample only the remaining two lines
+    # (batched with any other prompts in flight)
+    forced = f"Attack Type: {label}\nExplanation:"
+    output_text = forced + loaded["generator"].generate(f"{prompt}\n{forced}", **EXPLAIN_GENERATE_KWARGS)
+    logger.debug("GPT-2 Output: %s", output_text)
+
+    # Parse
+    with span("parse"):
+        parsed = parse_gpt_output(output_text)
+    gpt_explanation = parsed["explanation"]
+    patch = parsed["patch"]
+
+    # Retry logic for a truncated answer
+    if gpt_explanation == "No explanation available." or patch == "No patch suggested.":
+        logger.info("Incomplete explanation. Retrying...")
+        output_text = forced + loaded["generator"].generate(f"{prompt}\n{forced}", **EXPLAIN_GENERATE_KWARGS)
+        logger.debug("GPT-2 Retry Output: %s", output_text)
+
+        with span("parse"):
+            parsed = parse_gpt_output(output_text)  # 👈 Fixed function name
+        logger.debug("Parsed Retry Output: %s", parsed)
+        gpt_explanation = parsed["explanation"]
+        patch = parsed["patch"]
+
+    # Still incomplete: use the text the model was fine-tuned on
+    if gpt_explanation == "No explanation available." or patch == "No patch suggested.":
+        gpt_explanation, patch = get_template(attack)
+
+    return attack, gpt_explanation, patch
+
+
+explanation_cache = ExplanationCache(max_entries=EXPLAIN_CACHE_SIZE, ttl=EXPLAIN_CACHE_TTL)
+
+
+def signature_of(can_id, dlc, bytes_list):
+    return frame_signature(can_id, dlc, bytes_list, bucket=EXPLAIN_CACHE_BUCKET)
+
+
+def explain_anomaly_result(can_id, dlc, bytes_list):
+    """
+    explain_anomaly() packed into the same keys /detect returns.
+    Identified attacks are cached by frame signature; unidentified ones are
+    not, so a later frame with the same signature gets a fresh attempt.
+    """
+    attack, gpt_explanation, patch = explain_anomaly(can_id, dlc, bytes_list)
+    result = {"attack_type": attack, "gpt_explanation": gpt_explanation, "suggested_patch": patch}
+    if attack != UNIDENTIFIED_ATTACK:
+        explanation_cache.put(signature_of(can_id, dlc, bytes_list), result)
+    return result
+
+
+def log_settled_explanation(ticket, contexts):
+    """Log every anomalous frame ((vehicle_id, score) context) that was coalesced into a settled ticket."""
+    if ticket["status"] == "done":
+        result = ticket["result"]
+        attack, gpt_explanation, patch = result["attack_type"], result["gpt_explanation"], result["suggested_patch"]
+    elif ticket["status"] == "dropped":
+        attack = "Unclassified anomaly"
+        gpt_explanation = "Explanation skipped: analysis queue is full."
+        patch = "No patch suggested."
+    else:
+        attack = "Unclassified anomaly"
+        gpt_explanation = f"Explanation failed: {ticket['result'].get('error')}"
+        patch = "No patch suggested."
+
+    record_threats([(vehicle_id, score, attack, gpt_explanation, patch, 1) for vehicle_id, score in contexts])
+
+
+explanation_queue = ExplanationQueue(
+    explain_anomaly_result,
+    on_complete=log_settled_explanation,
+    workers=EXPLAIN_WORKERS,
+    max_pending=EXPLAIN_QUEUE_SIZE,
+    store=SharedTicketStore() if STATE_BACKEND == "sqlite" else None
+)
+
+
+def pending_response(ticket):
+    """Fields returned for an anomaly whose explanation is still queued."""
+    if ticket["status"] == "dropped":
+        explanation = "Explanation skipped: analysis queue is full."
+    else:
+        explanation = "Threat explanation is being generated."
+    return {
+        "attack_type": "Analysis pending",
+        "gpt_explanation": explanation,
+        "suggested_patch": "Pending analysis",
+        "ticket_id": ticket["ticket_id"],
+        "explanation_status": ticket["status"]
+    }
+
+
 # Detect anomalies in CAN packets
 @app.route('/detect', methods=['POST'])
 def detect():
@@ -225,83 +513,39 @@ def detect():
         can_id = data["can_id"]
         dlc = data["dlc"]
 
-        # For Isolation Forest input
-        features_dict = {
-            "can_id": can_id,
-            "dlc": dlc,
-            **{f"byte_{i}": bytes_list[i] for i in range(8)}
-        }
-
-        features_df = pd.DataFrame([features_dict])
-        prediction = anomaly_model.predict(features_df)[0]  # 👈 Use correct model here
-        print("🔍 Anomaly detection result:", prediction)
-
-        if prediction == -1:
-            # Initial GPT prompt
-            prompt = f"CAN ID: {can_id}, DLC: {dlc}, Data: {bytes_list}"
-            print("Prompt for GPT-2:", prompt)
-
-            # Tokenize
-            inputs = tokenizer(prompt, return_tensors="pt")  # 👈 Correct tokenizer
-            outputs = model.generate(
-                **inputs,
-                max_length=256,
-                do_sample=True,
-                top_k=50,
-                temperature=0.9,
-                repetition_penalty=1.2,
-                pad_token_id=tokenizer.eos_token_id
-            )
-            output_text = tokenizer.decode(outputs[0], skip_special_tokens=True)
-            print("GPT-2 Output:", output_text)
-
-            # Parse
-            parsed = parse_gpt_output(output_text)
-            attack = parsed["attack_type"]
-            gpt_explanation = parsed["explanation"]
-            patch = parsed["patch"]
-
-            # log_threat(data["vehicle_id"], prediction, attack, gpt_explanation, patch)
-
-            # Retry logic for unclear attack
-            if attack.lower() in ["unknown", "undefined", "not detected", "attack"]:
-                print("🔴 Unknown attack detected. Retrying with context...")
-                retry_prompt = f"CAN ID: {can_id}, DLC: {dlc}, Data: {bytes_list}"
-                inputs = tokenizer(retry_prompt.strip(), return_tensors="pt")
-                outputs = model.generate(
-                    **inputs,
-                    max_length=256,
-                    do_sample=True,
-                    top_k=50,
-                    temperature=0.9,
-                    repetition_penalty=1.2,
-                    pad_token_id=tokenizer.eos_token_id
-                )
-                output_text = tokenizer.decode(outputs[0], skip_special_tokens=True)
-                print("GPT-2 Retry Output:", output_text)
-
-                parsed = parse_gpt_output(output_text)  # 👈 Fixed function name
-                print("Parsed Retry Output:", parsed)
-                attack = parsed["attack_type"]
-                gpt_explanation = parsed["explanation"]
-                patch = parsed["patch"]
-
-            if attack.lower() in ["unknown", "undefined", "not detected", "attack"]:
-                attack = "Attack type could not be identified."
-                gpt_explanation = "No valid attack explanation available."
-                patch = "Unable to suggest a valid patch."
-
+        # Continuous Isolation Forest score, tiered by the threshold table
+        loaded = detector.get()
+        score = float(score_frames(build_feature_matrix([data], loaded), loaded)[0])
+        tier = thresholds.tier(data["vehicle_id"], can_id, score)
+        logger.debug("Anomaly detection result: %s (%s)", score, tier)
+        fleet.update(data["vehicle_id"], data, 1 if tier == NORMAL else -1, score)
+
+        if tier != NORMAL:
+            signature = signature_of(can_id, dlc, bytes_list)
+            cached = explanation_cache.get(signature)
+            if cached is not None:
+                attack, gpt_explanation, patch = cached["attack_type"], cached["gpt_explanation"], cached["suggested_patch"]
+            elif tier == SUSPECT:
+                attack, gpt_explanation, patch = SUSPECT_RESULT
+            elif request.args.get("sync", "").lower() in ("1", "true", "yes"):
+                result = explain_anomaly_result(can_id, dlc, bytes_list)
+                attack, gpt_explanation, patch = result["attack_type"], result["gpt_explanation"], result["suggested_patch"]
+            else:
+                # Explanation runs in the background; the frame is logged when it settles
+                ticket = explanation_queue.submit(signature, (can_id, dlc, bytes_list), (data["vehicle_id"], score))
+                return jsonify({"result": "anomaly", "tier": tier, "score": score, **pending_response(ticket)})
         else:
             attack = "No attack detected"
             gpt_explanation = "No anomaly detected. System ready to go."
             patch = "No patch needed"
-            # log_threat(data["vehicle_id"], prediction, attack, gpt_explanation, patch)
 
         # Log it
-        log_threat(data["vehicle_id"], prediction, attack, gpt_explanation, patch)
+        record_threats([(data["vehicle_id"], score, attack, gpt_explanation, patch, int(tier != NORMAL))])
 
         return jsonify({
-            "result": "anomaly" if prediction == -1 else "normal",
+            "result": "normal" if tier == NORMAL else "anomaly",
+            "tier": tier,
+            "score": score,
             "attack_type": attack,
             "gpt_explanation": gpt_explanation,
             "suggested_patch": patch
@@ -309,6 +553,94 @@ def detect():
 
     except Exception as e:
         return jsonify({"error": str(e)})
+
+
+# Detect anomalies for many CAN packets in one request
+@app.route('/detect_batch', methods=['POST'])
+def detect_batch():
+    """
+    Body: {"vehicle_id": "...", "frames": [{can_id, dlc, byte_0..byte_7}, ...]}
+    A frame may carry its own vehicle_id; otherwise the top-level one is used.
+    All frames are scored in one model call and logged in one transaction.
+    GPT explanations are skipped unless "explain": true is sent, in which
+    case outlier-tier anomalies are queued for background explanation and
+    get a ticket_id.
+    """
+    try:
+        data = request.get_json()
+        frames = data.get("frames", [])
+        if not frames:
+            return jsonify({"error": "frames list is required."})
+
+        default_vehicle = data.get("vehicle_id", "Vehicle_001")
+        explain = bool(data.get("explain", False))
+
+        for frame in frames:
+            frame.setdefault("vehicle_id", default_vehicle)
+
+        loaded = detector.get()
+        scores = score_frames(build_feature_matrix(frames, loaded), loaded)
+
+        results = []
+        log_rows = []
+        anomalies = 0
+        for frame, score in zip(frames, scores):
+            vehicle_id = frame["vehicle_id"]
+            score = float(score)
+            tier = thresholds.tier(vehicle_id, frame["can_id"], score)
+            fleet.update(vehicle_id, frame, 1 if tier == NORMAL else -1, score)
+
+            if tier != NORMAL:
+                anomalies += 1
+                can_id, dlc = frame["can_id"], frame["dlc"]
+                bytes_list = [frame.get(f"byte_{i}", 0) for i in range(8)]
+                signature = signature_of(can_id, dlc, bytes_list)
+                cached = explanation_cache.get(signature) if explain else None
+
+                if cached is not None:
+                    attack, gpt_explanation, patch = cached["attack_type"], cached["gpt_explanation"], cached["suggested_patch"]
+                elif explain and tier == OUTLIER:
+                    ticket = explanation_queue.submit(signature, (can_id, dlc, bytes_list), (vehicle_id, score))
+                    results.append({
+                        "vehicle_id": vehicle_id,
+                        "result": "anomaly",
+                        "tier": tier,
+                        "score": score,
+                        **pending_response(ticket)
+                    })
+                    continue
+                elif explain:
+                    attack, gpt_explanation, patch = SUSPECT_RESULT
+                else:
+                    attack = "Unclassified anomaly"
+                    gpt_explanation = "Explanation not requested for batch detection."
+                    patch = "No patch suggested."
+            else:
+                attack = "No attack detected"
+                gpt_explanation = "No anomaly detected. System ready to go."
+                patch = "No patch needed"
+
+            log_rows.append((vehicle_id, score, attack, gpt_explanation, patch, int(tier != NORMAL)))
+            results.append({
+                "vehicle_id": vehicle_id,
+                "result": "normal" if tier == NORMAL else "anomaly",
+                "tier": tier,
+                "score": score,
+                "attack_type": attack,
+                "gpt_explanation": gpt_explanation,
+                "suggested_patch": patch
+            })
+
+        record_threats(log_rows)
+
+        return jsonify({
+            "count": len(results),
+            "anomalies": anomalies,
+            "results": results
+        })
+
+    except Exception as e:
+        return jsonify({"error": str(e)})
     
 
 # @app.route('/g_detect', methods=['POST'])
@@ -365,19 +697,81 @@ def detect():
 #         return jsonify({"error": str(e)})
 
 
+# Fetch a queued GPT explanation; ?wait=N long-polls up to N seconds
+@app.route('/explanation/<ticket_id>', methods=['GET'])
+def explanation(ticket_id):
+    wait = min(request.args.get('wait', default=0, type=float), 30)
+    ticket = explanation_queue.get(ticket_id, wait=wait)
+    if ticket is None:
+        return jsonify({"error": "Unknown or expired ticket."}), 404
+    return jsonify(ticket)
+
+
+# Server-Sent Events: ?topics=history,threat,patch,vehicle (default: all)
+@app.route('/stream', methods=['GET'])
+def stream():
+    if stream_port is not None:
+        # Under gunicorn a stream would hold a request thread for as long as
+        # the tab is open; send the browser to the asyncio server instead
+        if stream_public_url:
+            query = request.query_string.decode()
+            return redirect(f"{stream_public_url}?{query}" if query else stream_public_url, code=307)
+        hostname = urlsplit(request.host_url).hostname
+        host = f"[{hostname}]" if ":" in hostname else hostname  # IPv6
+        return redirect(f"{request.scheme}://{host}:{stream_port}{request.full_path}", code=307)
+
+    topics = [topic for topic in request.args.get('topics', '').split(',') if topic]
+    subscriber = event_bus.subscribe(topics or None)
+    return Response(
+        stream_with_context(sse_stream(event_bus, subscriber)),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+# Current score thresholds; edit thresholds.json (or POST /thresholds/reload) to change them
+@app.route('/thresholds', methods=['GET'])
+def get_thresholds():
+    return jsonify(thresholds.snapshot())
+
+@app.route('/thresholds/reload', methods=['POST'])
+def reload_thresholds():
+    if not thresholds.reload():
+        return jsonify({"error": "Invalid thresholds file; previous thresholds kept."}), 400
+    return jsonify(thresholds.snapshot())
+
+
 # Return current vehicle CAN data
 @app.route('/vehicle_data', methods=['GET'])
 def vehicle_data():
-    print("📡 Sending vehicle data:", current_vehicle_data)
-    return jsonify(current_vehicle_data)
+    frame = fleet.latest_frame(SIMULATED_VEHICLE)
+    logger.debug("Sending vehicle data: %s", frame)
+    return jsonify(frame)
+
+# Latest frame, health and verdict for one vehicle
+@app.route('/vehicle_data/<vehicle_id>', methods=['GET'])
+def vehicle_state(vehicle_id):
+    state = fleet.get(vehicle_id)
+    if state is None:
+        return jsonify({"error": f"Unknown vehicle: {vehicle_id}"}), 404
+    return jsonify(state)
+
+# Bulk snapshot of the fleet, paged by vehicle_id
+@app.route('/fleet', methods=['GET'])
+def fleet_snapshot():
+    offset = request.args.get('offset', default=0, type=int)
+    limit = min(request.args.get('limit', default=1000, type=int), 10000)
+    return jsonify({"total": fleet.count(), "offset": offset, "vehicles": fleet.snapshot(offset, limit)})
 
 # Return recent history
 @app.route('/history', methods=['GET'])
 def history():
     try:
         limit = request.args.get('limit', default=10, type=int)
-        history_data = fetch_history(limit)
-        return jsonify({"history": history_data})
+        before = request.args.get('cursor', default=None, type=int)
+        vehicle_id = request.args.get('vehicle_id', default=None)
+        history_data = fetch_history(limit, before, vehicle_id)
+        return jsonify({"history": history_data, "next_cursor": next_cursor(history_data, limit)})
     except Exception as e:
         return jsonify({"error": str(e)})
     
@@ -386,8 +780,10 @@ def history():
 def threat():
     try:
         limit = request.args.get('limit', default=10, type=int)
-        history_data = fetch_threat_history(limit)
-        return jsonify({"history": history_data})
+        before = request.args.get('cursor', default=None, type=int)
+        vehicle_id = request.args.get('vehicle_id', default=None)
+        history_data = fetch_threat_history(limit, before, vehicle_id)
+        return jsonify({"history": history_data, "next_cursor": next_cursor(history_data, limit)})
     except Exception as e:
         return jsonify({"error": str(e)})
 
@@ -435,17 +831,21 @@ def apply_patch():
         if not patch_text:
             return jsonify({"error": "Patch text is required."})
 
-        # Step 1: Encode patch into CAN byte-style format
+        # Step 1: Encode patch (text or catalog ID) into CAN byte-style format
         can_patch = encode_patch_to_can(patch_text)
 
         # Step 2: Log the applied patch (optional, for history)
-        log_patch(patch_text)
-        print(patch_text)
+        vehicle_id = data.get("vehicle_id", "001")
+        log_patch(patch_text, vehicle_id)
+        event_bus.publish("patch", {"patch": patch_text, "patch_data": can_patch, "vehicle_ids": [vehicle_id]})
+        metrics.increment("patches_applied_total", 1, "Vehicles patched")
+        logger.info("Patch applied: %s", patch_text)
 
         # Step 3: Return response
         return jsonify({
             "status": "Patch applied successfully.",
             "patch_applied": patch_text,
+            "patch_id": resolve_patch_id(patch_text),
             "patch_data": can_patch
         })
     
@@ -453,31 +853,104 @@ def apply_patch():
     except Exception as e:
         return jsonify({"error": str(e)})
 
+# Push one patch to many vehicles at once
+@app.route('/apply_patch_batch', methods=['POST'])
+def apply_patch_batch():
+    """
+    Body: {"patch": "<patch text or catalog ID>", "vehicle_ids": ["Vehicle_001", ...]}
+    The patch is encoded once, every vehicle's row is logged in one
+    transaction, and /stream gets a single patch event for the whole push.
+    """
+    try:
+        data = request.get_json()
+        patch_text = data.get("patch", None)
+        vehicle_ids = list(dict.fromkeys(data.get("vehicle_ids", [])))
 
-# Simulated GPT-like chatbot response
+        if not patch_text:
+            return jsonify({"error": "Patch text is required."})
+        if not vehicle_ids:
+            return jsonify({"error": "vehicle_ids list is required."})
+
+        can_patch = encode_patch_to_can(patch_text)
+        with span("db_enqueue"):
+            log_patches(patch_text, vehicle_ids)
+        event_bus.publish("patch", {"patch": patch_text, "patch_data": can_patch, "vehicle_ids": vehicle_ids})
+        metrics.increment("patches_applied_total", len(vehicle_ids), "Vehicles patched")
+        logger.info("Patch applied to %d vehicles: %s", len(vehicle_ids), patch_text)
+
+        return jsonify({
+            "status": "Patch applied successfully.",
+            "patch_applied": patch_text,
+            "patch_id": resolve_patch_id(patch_text),
+            "patch_data": can_patch,
+            "vehicles_patched": len(vehicle_ids)
+        })
+
+    except Exception as e:
+        return jsonify({"error": str(e)})
+
+
+# Chat answers end at the first line break after some text
+FIRST_LINE = re.compile(r"\S[^\n]*\n")
+
+CHAT_GENERATE_KWARGS = {
+    "max_length": 100,
+    "do_sample": True,
+    "top_k": 50,
+    "temperature": 0.9,
+    "repetition_penalty": 1.2
+}
+
+def stream_response(user_input):
+    """
+    Stream the first line of the chatbot answer as Server-Sent Events: one
+    `token` event per decoded chunk, then `done` with the whole line.
+    Generation stops at the newline instead of running to max_length.
+    """
+    chunks = gpt.get()["generator"].stream(user_input, stop_pattern=FIRST_LINE, **CHAT_GENERATE_KWARGS)
+
+    def events():
+        answer = ""
+        try:
+            for chunk in chunks:
+                if not answer:
+                    chunk = chunk.lstrip()
+                chunk, newline, _ = chunk.partition("\n")
+                if chunk:
+                    answer += chunk
+                    yield format_event("token", {"text": chunk})
+                if newline and answer:
+                    break
+            yield format_event("done", {"response": answer})
+        except Exception as e:
+            yield format_event("error", {"error": str(e)})
+        finally:
+            chunks.close()
+
+    return Response(
+        stream_with_context(events()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+# Simulated GPT-like chatbot response (?stream=true for token streaming)
 @app.route('/generate-response', methods=['POST'])
 def generate_response():
     try:
         data = request.get_json()
         user_input = data.get("input", "No input provided.")
 
-        # Tokenize input
-        inputs = tokenizer(user_input, return_tensors="pt")
-
-        # Generate output
-        outputs = model.generate(
-            **inputs,
-            max_length=100,
-            do_sample=True,
-            top_k=50,
-            temperature=0.9,
-            repetition_penalty=1.2,
-            pad_token_id=tokenizer.eos_token_id
+        if request.args.get("stream", "").lower() in ("1", "true", "yes"):
+            return stream_response(user_input)
+
+        # Generate only the answer, stopping at its first line like the stream
+        # (batched with concurrent requests)
+        output_text = gpt.get()["generator"].generate(
+            user_input, stop_pattern=FIRST_LINE, new_tokens_only=True, **CHAT_GENERATE_KWARGS
         )
 
-        # Decode and take only the first line
-        output_text = tokenizer.decode(outputs[0], skip_special_tokens=True)
-        first_line = output_text.strip().split("\n")[0]
+        # Take only the first line
+        first_line = output_text.lstrip().partition("\n")[0]
 
         return jsonify({"response": first_line})
 
@@ -485,15 +958,120 @@ def generate_response():
         return jsonify({"error": str(e)})
 
 
-# Optional: Health check route
+# Per-endpoint request latency for /metrics (/stream is long-lived, so skipped)
+@app.before_request
+def start_request_timer():
+    request.start_time = time.perf_counter()
+
+@app.after_request
+def record_request_time(response):
+    start = getattr(request, "start_time", None)
+    if start is not None and request.endpoint not in (None, "stream"):
+        metrics.histogram("http_request_seconds", "Request latency per endpoint", endpoint=request.endpoint).observe(time.perf_counter() - start)
+    return response
+
+
+metrics.gauge("explanation_queue_depth", lambda: explanation_queue.depth(), "Anomalies waiting for an explanation")
+metrics.gauge("explanation_queue_events", lambda: {(("event", key),): value for key, value in explanation_queue.stats.items()}, "Explanation queue submissions by outcome")
+metrics.gauge("explanation_cache_lookups", lambda: {(("result", "hit"),): explanation_cache.hits, (("result", "miss"),): explanation_cache.misses}, "Explanation cache lookups")
+metrics.gauge("stream_subscribers", lambda: event_bus.subscriber_count(), "Connected /stream clients")
+metrics.gauge("fleet_vehicles", lambda: fleet.count(), "Vehicles in the fleet state store")
+
+
+# Prometheus text exposition
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+
+# Optional: Health check route (liveness; never waits for models)
 @app.route('/health', methods=['GET'])
 def health():
-    return jsonify({"status": "OK"})
+    return jsonify({
+        "status": "OK",
+        "explanation_queue": {"depth": explanation_queue.depth(), **explanation_queue.stats},
+        "explanation_cache": explanation_cache.stats(),
+        "generation": gpt.get()["generator"].stats if gpt.loaded else None
+    })
+
+# Readiness: 200 only once the models needed by /detect are loaded
+@app.route('/ready', methods=['GET'])
+def ready():
+    components = {resource.name: resource.status() for resource in (detector, gpt)}
+    for resource in (detector, gpt):
+        if resource.loaded:
+            components[resource.name]["backend"] = resource.get()["backend"]
+    is_ready = detector.loaded and gpt.loaded
+    return jsonify({"ready": is_ready, "components": components}), (200 if is_ready else 503)
+
+# Model registry: active versions, reload latency and available versions
+@app.route('/models', methods=['GET'])
+def models():
+    return jsonify({
+        name: {**resource.status(), "versions": [CURRENT] + list_versions(name)}
+        for name, resource in MODELS.items()
+    })
+
+# Load a version in the background and swap it in; in-flight requests finish on the old one
+@app.route('/models/<name>/reload', methods=['POST'])
+def reload_model(name):
+    resource = MODELS.get(name)
+    if resource is None:
+        return jsonify({"error": f"Unknown model: {name}"}), 404
+
+    version = (request.get_json(silent=True) or {}).get("version", CURRENT)
+    try:
+        artifact_path(name, version)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    if not resource.reload(version):
+        return jsonify({"error": f"{name} is already reloading."}), 409
+    return jsonify({"status": "reloading", "model": name, "version": version}), 202
+
+
+def watch_models():
+    """
+    Reload a model in the background when its served artifact changes on
+    disk (training.py / fine_tuning.py promoted a new version). A change is
+    acted on only once the files have been stable for one interval, so a
+    half-written model directory is never loaded. Models switched to a
+    specific version through /models are left alone.
+    """
+    seen = {name: artifact_mtime(artifact_path(name)) for name in MODELS}
+    candidates = {}
+    while True:
+        time.sleep(MODEL_WATCH_INTERVAL)
+        for name, resource in MODELS.items():
+            mtime = artifact_mtime(artifact_path(name))
+            if mtime == seen[name]:
+                candidates.pop(name, None)
+                continue
+            if candidates.get(name) != mtime:
+                candidates[name] = mtime
+                continue
+            if not resource.loaded or resource.version != CURRENT or resource.reload(CURRENT):
+                seen[name] = mtime
+                candidates.pop(name, None)
+
+def start_model_watcher():
+    if MODEL_WATCH_INTERVAL > 0:
+        threading.Thread(target=watch_models, name="model-watcher", daemon=True).start()
+
+# Load models according to STARTUP_MODE
+if STARTUP_MODE == "eager":
+    detector.get()
+    gpt.get()
+elif STARTUP_MODE == "warm":
+    detector.warm_up()
+    gpt.warm_up()
 
 # Start everything
 if __name__ == '__main__':
     # Start the background CAN data simulation thread
-    threading.Thread(target=update_vehicle_data, daemon=True).start()
-    
+    start_simulator()
+    start_model_watcher()
+
+    # Development server only; use gunicorn (see wsgi.py) in production.
     # Run the Flask app without auto-reloader (to avoid thread issues)
     app.run(debug=True, use_reloader=False, host="localhost", port=5000)
@@ -0,0 +1,74 @@
+import torch
+
+from attack_templates import TRAINED_LABELS
+from instrumentation import span
+
+
+class AttackClassifier:
+    """
+    Classifies an anomalous frame by scoring each trained
+    "Attack Type: <label>" continuation of the prompt in a single batched
+    forward pass, instead of sampling the full three-line answer.
+    The label with the highest total log-probability wins. Concurrent
+    prompts can be scored together (score_batch), which is how
+    GenerationBatcher.classify runs them.
+    """
+
+    def __init__(self, model, tokenizer, labels=None):
+        self.model = model
+        self.tokenizer = tokenizer
+        self.labels = list(labels or TRAINED_LABELS)
+
+        # Same layout as the fine-tuning text: prompt + "\n" + target
+        self.candidate_ids = [
+            tokenizer(f"\nAttack Type: {label}")["input_ids"] for label in self.labels
+        ]
+        self.pad_id = tokenizer.pad_token_id if tokenizer.pad_token_id is not None else tokenizer.eos_token_id
+
+    def score(self, prompt):
+        """Return {label: summed log-probability of its continuation}."""
+        return self.score_batch([prompt])[0]
+
+    def score_batch(self, prompts):
+        """score() for several prompts in one forward pass."""
+        with span("tokenize"):
+            prompt_ids = [self.tokenizer(prompt)["input_ids"] for prompt in prompts]
+        sequences = [ids + candidate for ids in prompt_ids for candidate in self.candidate_ids]
+        width = max(len(seq) for seq in sequences)
+
+        # Right padding is fine here: only real positions are read back
+        input_ids = torch.full((len(sequences), width), self.pad_id, dtype=torch.long)
+        attention_mask = torch.zeros((len(sequences), width), dtype=torch.long)
+        for row, seq in enumerate(sequences):
+            input_ids[row, :len(seq)] = torch.tensor(seq, dtype=torch.long)
+            attention_mask[row, :len(seq)] = 1
+
+        with span("classify_forward"), torch.inference_mode():
+            logits = self.model(input_ids=input_ids, attention_mask=attention_mask).logits
+
+        # Position t predicts token t + 1
+        log_probs = torch.log_softmax(logits[:, :-1].float(), dim=-1)
+        token_log_probs = log_probs.gather(-1, input_ids[:, 1:].unsqueeze(-1)).squeeze(-1)
+
+        results = []
+        for index, ids in enumerate(prompt_ids):
+            start = len(ids) - 1
+            first_row = index * len(self.labels)
+            results.append({
+                label: token_log_probs[first_row + row, start:start + len(candidate)].sum().item()
+                for row, (label, candidate) in enumerate(zip(self.labels, self.candidate_ids))
+            })
+        return results
+
+    def best_label(self, prompt):
+        """Return the most likely label as the model writes it (e.g. "Attack")."""
+        return self.best_labels([prompt])[0]
+
+    def best_labels(self, prompts):
+        """best_label() for several prompts in one forward pass."""
+        return [max(scores, key=scores.get) for scores in self.score_batch(prompts)]
+
+    def classify(self, prompt):
+        """Return the template key (e.g. "DoS") for the most likely trained label."""
+        best = self.best_label(prompt)
+        return TRAINED_LABELS.get(best, best)
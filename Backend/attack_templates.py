@@ -0,0 +1,56 @@
+"""
+Fixed explanation/patch text for each OTIDS attack class.
+fine_tuning.py trains the model on exactly these targets, and the
+template fast path in app.py answers from this table directly.
+"""
+
+ATTACK_TEMPLATES = {
+    "DoS": (
+        "A DoS attack floods the CAN bus with high-priority messages, preventing normal communication.",
+        "Activate the vehicle's security update to handle message overloads."
+    ),
+    "Fuzzy": (
+        "A Fuzzy attack sends malformed or random data to confuse or crash ECUs.",
+        "Enable data validity checks to prevent unsafe reads."
+    ),
+    "Impersonation": (
+        "An Impersonation attack uses spoofed IDs to mimic legitimate ECUs and inject malicious data.",
+        "Turn on ID verification to block unauthorized messages."
+    ),
+    "Attack_free": (
+        "No attack detected. All vehicle systems appear to be operating normally.",
+        "No action needed – vehicle is normal."
+    ),
+}
+
+ATTACK_TYPES = list(ATTACK_TEMPLATES)
+
+# Reported when the model cannot name the attack behind an anomalous frame
+UNIDENTIFIED_ATTACK = "Attack type could not be identified."
+UNIDENTIFIED_TEMPLATE = ("No valid attack explanation available.", "Unable to suggest a valid patch.")
+
+# fine_tuning.py takes the label from the dataset file-name prefix, so the
+# attack-free file is trained as "Attack Type: Attack". Map what the model
+# actually emits back to the template keys. Only anomalous frames are
+# classified, so "Attack" (attack-free) means the attack is unidentified.
+TRAINED_LABELS = {
+    "DoS": "DoS",
+    "Fuzzy": "Fuzzy",
+    "Impersonation": "Impersonation",
+    "Attack": UNIDENTIFIED_ATTACK,
+}
+
+UNKNOWN_TEMPLATE = ("Unknown attack type.", "No patch suggestion available.")
+
+
+def get_template(attack_type):
+    """Return (explanation, patch) for an attack type."""
+    if attack_type == UNIDENTIFIED_ATTACK:
+        return UNIDENTIFIED_TEMPLATE
+    return ATTACK_TEMPLATES.get(attack_type, UNKNOWN_TEMPLATE)
+
+
+def format_target(attack_type):
+    """The three-line target text the model is fine-tuned to produce."""
+    explanation, patch = get_template(attack_type)
+    return f"Attack Type: {attack_type}\nExplanation: {explanation}\nSuggested Patch: {patch}"
@@ -0,0 +1,263 @@
+"""
+Latency / throughput benchmark for the Flask detection API.
+
+    python benchmark.py                         # run all scenarios, save JSON
+    python benchmark.py --scenarios detect_normal,history --requests 500
+    python benchmark.py --compare old.json new.json
+
+Frames come from can_simulator.generate_can_data with a fixed seed, so runs
+are repeatable. /detect is split into normal and anomaly scenarios, and
+each /detect response is also bucketed by the verdict the server returned.
+The explain_* scenarios time the GPT side: they send frames the server
+tiers as outliers, either to /detect?sync=1 or to /detect followed by
+polling /explanation/<ticket_id> until it settles.
+Results are written to benchmarks/<timestamp>-<commit>.json.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import time
+
+import aiohttp
+
+from can_simulator import generate_can_data
+from stream_simulator import percentile
+
+DEFAULT_URL = "http://127.0.0.1:5000"
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmarks")
+
+PATCHES = [
+    "Activate the vehicle's security update to handle message overloads.",
+    "Enable data validity checks to prevent unsafe reads.",
+    "Turn on ID verification to block unauthorized messages.",
+]
+
+
+def _detect(healthy):
+    return lambda rng, i: ("POST", "/detect", generate_can_data(f"Bench_{i % 50:03d}", healthy, rng))
+
+
+def batch_frames(rng, healthy=None, size=100):
+    """Frames for /detect_batch with capture timestamps 10 ms apart (window-feature models need them)."""
+    start = time.time()
+    return [
+        {**generate_can_data(f"Bench_{j:03d}", healthy, rng), "timestamp": start + j * 0.01}
+        for j in range(size)
+    ]
+
+
+# name -> request factory(rng, index) returning (method, path, json body or None)
+SCENARIOS = {
+    "detect_normal": _detect(True),
+    "detect_anomaly": _detect(False),
+    "detect_batch": lambda rng, i: ("POST", "/detect_batch", {"frames": batch_frames(rng)}),
+    "history": lambda rng, i: ("GET", "/history?limit=10", None),
+    "threat": lambda rng, i: ("GET", "/threat?limit=10", None),
+    "apply_patch": lambda rng, i: ("POST", "/apply_patch", {"patch": rng.choice(PATCHES)}),
+    "generate_response": lambda rng, i: ("POST", "/generate-response", {"input": "What is a DoS attack on the CAN bus?"}),
+}
+
+# name -> /detect path for outlier frames; each request is timed until its explanation is ready
+EXPLAIN_SCENARIOS = {
+    "explain_sync": "/detect?sync=1",
+    "explain_ticket": "/detect",
+}
+
+# Generation is orders of magnitude slower than everything else
+SCENARIO_REQUESTS = {"generate_response": 20, "explain_sync": 20, "explain_ticket": 20}
+
+# Longest a single /explanation long-poll may wait (the server caps it at 30)
+TICKET_WAIT = 30
+
+
+async def find_outlier_frames(session, url, count, rng, max_probes=50):
+    """
+    Anomaly-profile frames that the server's model and thresholds tier as
+    outliers, found by scoring candidates through /detect_batch. Every
+    frame is used once, since a repeated frame would be answered from the
+    explanation cache instead of the model.
+    """
+    found = []
+    for _ in range(max_probes):
+        frames = batch_frames(rng, healthy=False)
+        async with session.post(url + "/detect_batch", json={"frames": frames}) as response:
+            results = (await response.json()).get("results", [])
+        for frame, result in zip(frames, results):
+            if result.get("tier") == "outlier":
+                frame.pop("timestamp")  # single /detect frames use their arrival time
+                found.append(frame)
+        if len(found) >= count:
+            return found[:count]
+    raise RuntimeError(f"Only {len(found)} of {count} probe frames scored as outliers")
+
+
+async def wait_for_ticket(session, url, ticket_id):
+    """Long-poll /explanation/<ticket_id> until the ticket is no longer pending."""
+    while True:
+        async with session.get(f"{url}/explanation/{ticket_id}?wait={TICKET_WAIT}") as response:
+            ticket = await response.json()
+        if response.status != 200 or ticket.get("status") != "pending":
+            return ticket
+
+
+def summarize(latencies, elapsed, errors):
+    latencies = sorted(latencies)
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "throughput_rps": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        "latency_ms": {
+            "p50": round(percentile(latencies, 50) * 1000, 2),
+            "p95": round(percentile(latencies, 95) * 1000, 2),
+            "p99": round(percentile(latencies, 99) * 1000, 2),
+            "mean": round(sum(latencies) / len(latencies) * 1000, 2) if latencies else 0.0
+        }
+    }
+
+
+async def run_scenario(session, url, name, requests, concurrency, seed, warmup):
+    rng = random.Random(seed)
+    if name in EXPLAIN_SCENARIOS:
+        # Unseeded: frames repeated from an earlier run would hit the server's explanation cache
+        outliers = await find_outlier_frames(session, url, warmup + requests, random.Random())
+        factory = lambda rng, i: ("POST", EXPLAIN_SCENARIOS[name], outliers.pop())
+    else:
+        factory = SCENARIOS[name]
+    latencies = []
+    by_result = {}
+    errors = 0
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(i, record):
+        nonlocal errors
+        method, path, body = factory(rng, i)
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                async with session.request(method, url + path, json=body) as response:
+                    result = await response.json()
+                    failed = response.status >= 500 or "error" in result
+                if name in EXPLAIN_SCENARIOS and "ticket_id" in result:
+                    ticket = await wait_for_ticket(session, url, result["ticket_id"])
+                    failed = ticket.get("status") != "done"
+                elapsed = time.perf_counter() - start
+            except Exception:
+                elapsed, result, failed = time.perf_counter() - start, {}, True
+
+        if not record:
+            return
+        if failed:
+            errors += 1
+            return
+        latencies.append(elapsed)
+        if path == "/detect":
+            by_result.setdefault(result.get("result", "unknown"), []).append(elapsed)
+
+    await asyncio.gather(*(one(i, False) for i in range(warmup)))
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i, True) for i in range(requests)))
+    elapsed = time.perf_counter() - start
+
+    summary = summarize(latencies, elapsed, errors)
+    if by_result:
+        summary["by_result"] = {result: summarize(values, elapsed, 0) for result, values in by_result.items()}
+    return summary
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+    except Exception:
+        return "unknown"
+
+
+async def run_all(url, names, requests, concurrency, seed, warmup):
+    timeout = aiohttp.ClientTimeout(total=600)
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    results = {}
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+        for name in names:
+            count = min(requests, SCENARIO_REQUESTS.get(name, requests))
+            print(f"▶ {name}: {count} requests, concurrency {concurrency}")
+            results[name] = await run_scenario(session, url, name, count, concurrency, seed, min(warmup, count))
+            latency = results[name]["latency_ms"]
+            print(f"  {results[name]['throughput_rps']} req/s, p50 {latency['p50']} ms, "
+                  f"p95 {latency['p95']} ms, p99 {latency['p99']} ms, errors {results[name]['errors']}")
+    return results
+
+
+def compare(old_path, new_path):
+    with open(old_path) as f:
+        old = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+
+    print(f"{old['meta']['commit']} -> {new['meta']['commit']}")
+    for name, after in new["scenarios"].items():
+        before = old["scenarios"].get(name)
+        if before is None:
+            continue
+        parts = [f"{name:<18}"]
+        for key in ("p50", "p99"):
+            b, a = before["latency_ms"][key], after["latency_ms"][key]
+            change = (a - b) / b * 100 if b else 0.0
+            parts.append(f"{key} {b:.2f} -> {a:.2f} ms ({change:+.0f}%)")
+        b, a = before["throughput_rps"], after["throughput_rps"]
+        parts.append(f"rps {b} -> {a}")
+        print("  ".join(parts))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the detection API.")
+    parser.add_argument("--url", default=DEFAULT_URL)
+    parser.add_argument("--scenarios", default=",".join([*SCENARIOS, *EXPLAIN_SCENARIOS]))
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", default=None, help="JSON path (default: benchmarks/<timestamp>-<commit>.json)")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"))
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    names = [name for name in args.scenarios.split(",") if name]
+    unknown = [name for name in names if name not in SCENARIOS and name not in EXPLAIN_SCENARIOS]
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(unknown)}")
+
+    results = asyncio.run(run_all(args.url, names, args.requests, args.concurrency, args.seed, args.warmup))
+
+    commit = git_commit()
+    report = {
+        "meta": {
+            "commit": commit,
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "url": args.url,
+            "host": platform.node(),
+            "python": platform.python_version(),
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "seed": args.seed
+        },
+        "scenarios": results
+    }
+
+    output = args.output
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, f"{time.strftime('%Y%m%d-%H%M%S')}-{commit}.json")
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"✅ Results saved to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+import hashlib
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+# Feature order shared by the training scripts and app.py
+FEATURE_COLUMNS = ["can_id", "dlc"] + [f"byte_{i}" for i in range(8)]
+
+READ_BLOCK = 1 << 20
+
+# Parsed datasets are cached next to the source file by default
+CACHE_DIR_NAME = ".otids_cache"
+COLUMNS = ("timestamp", "can_id", "dlc", "payload")
+
+
+def count_lines(file_path):
+    """Count newlines with block reads, used to preallocate the output arrays."""
+    lines = 0
+    last = b"\n"
+    with open(file_path, "rb") as f:
+        while True:
+            block = f.read(READ_BLOCK)
+            if not block:
+                break
+            lines += block.count(b"\n")
+            last = block[-1:]
+    return lines + (0 if last == b"\n" else 1)
+
+
+def iter_otids_chunks(file_path, chunk_rows=100000, stats=None):
+    """
+    Stream an OTIDS text file in chunks of up to chunk_rows parsed frames.
+
+    Each line looks like:
+    Timestamp: 180.170712  ID: 0081  000  DLC: 8  7f 84 62 00 00 00 00 8e
+
+    Yields dicts of NumPy arrays: timestamp (float64), can_id (int32),
+    dlc (uint8) and payload (uint8, shape [n, 8], zero padded).
+    Unparseable lines are counted in stats instead of printed.
+    """
+    if stats is None:
+        stats = {}
+    stats.setdefault("lines", 0)
+    stats.setdefault("rows", 0)
+    stats.setdefault("skipped", 0)
+    stats.setdefault("errors", 0)
+
+    timestamps, can_ids, dlcs = [], [], []
+    payload = bytearray()
+
+    with open(file_path, "r") as f:
+        for line in f:
+            stats["lines"] += 1
+            parts = line.split()
+            if len(parts) < 7:
+                stats["skipped"] += 1
+                continue
+
+            try:
+                timestamp = float(parts[1])
+                can_id = int(parts[3], 16)
+                dlc = int(parts[6])
+                data_bytes = bytes.fromhex(" ".join(parts[7:7 + dlc]))[:8]
+            except ValueError:
+                stats["errors"] += 1
+                continue
+
+            timestamps.append(timestamp)
+            can_ids.append(can_id)
+            dlcs.append(dlc)
+            payload += data_bytes
+            payload += bytes(8 - len(data_bytes))  # pad to 8 bytes
+
+            if len(can_ids) >= chunk_rows:
+                stats["rows"] += len(can_ids)
+                yield _chunk_arrays(timestamps, can_ids, dlcs, payload)
+                timestamps, can_ids, dlcs = [], [], []
+                payload = bytearray()
+
+    if can_ids:
+        stats["rows"] += len(can_ids)
+        yield _chunk_arrays(timestamps, can_ids, dlcs, payload)
+
+
+def _chunk_arrays(timestamps, can_ids, dlcs, payload):
+    return {
+        "timestamp": np.array(timestamps, dtype=np.float64),
+        "can_id": np.array(can_ids, dtype=np.int32),
+        "dlc": np.array(dlcs, dtype=np.uint8),
+        "payload": np.frombuffer(bytes(payload), dtype=np.uint8).reshape(-1, 8),
+    }
+
+
+def load_otids(file_path, chunk_rows=100000):
+    """
+    Parse a whole OTIDS file into preallocated columnar arrays.
+    Returns (arrays, stats) where arrays has the same keys as
+    iter_otids_chunks and stats counts lines, rows, skipped and errors.
+    """
+    capacity = count_lines(file_path)
+    arrays = {
+        "timestamp": np.empty(capacity, dtype=np.float64),
+        "can_id": np.empty(capacity, dtype=np.int32),
+        "dlc": np.empty(capacity, dtype=np.uint8),
+        "payload": np.empty((capacity, 8), dtype=np.uint8),
+    }
+
+    stats = {}
+    filled = 0
+    for chunk in iter_otids_chunks(file_path, chunk_rows, stats):
+        n = len(chunk["can_id"])
+        for key, values in chunk.items():
+            arrays[key][filled:filled + n] = values
+        filled += n
+
+    return {key: values[:filled] for key, values in arrays.items()}, stats
+
+
+def file_digest(file_path):
+    """Short BLAKE2 hash of the file contents, used in cache directory names."""
+    digest = hashlib.blake2b(digest_size=8)
+    with open(file_path, "rb") as f:
+        while True:
+            block = f.read(READ_BLOCK)
+            if not block:
+                break
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def load_otids_cached(file_path, cache_dir=None):
+    """
+    Same result as load_otids, but the parsed columns are written once to
+    <cache_dir>/<file name>-<content hash>/<column>.npy and later calls
+    memory-map them instead of re-parsing the text. A changed source file
+    gets a new hash, so stale caches are never read and are removed.
+    """
+    if cache_dir is None:
+        cache_dir = os.path.join(os.path.dirname(os.path.abspath(file_path)), CACHE_DIR_NAME)
+
+    name = os.path.basename(file_path)
+    entry = os.path.join(cache_dir, f"{name}-{file_digest(file_path)}")
+    stats_path = os.path.join(entry, "stats.json")
+
+    if os.path.exists(stats_path):
+        arrays = {key: np.load(os.path.join(entry, f"{key}.npy"), mmap_mode="r") for key in COLUMNS}
+        with open(stats_path) as f:
+            stats = json.load(f)
+        stats["cached"] = True
+        return arrays, stats
+
+    arrays, stats = load_otids(file_path)
+
+    # Write to a temporary directory and rename, so readers never see a partial cache
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp_entry = f"{entry}.tmp{os.getpid()}"
+    shutil.rmtree(tmp_entry, ignore_errors=True)
+    os.makedirs(tmp_entry)
+    for key in COLUMNS:
+        np.save(os.path.join(tmp_entry, f"{key}.npy"), arrays[key])
+    with open(os.path.join(tmp_entry, "stats.json"), "w") as f:
+        json.dump(stats, f)
+
+    try:
+        os.rename(tmp_entry, entry)
+    except OSError:
+        # Another process finished the same cache first
+        shutil.rmtree(tmp_entry, ignore_errors=True)
+
+    # Drop caches built from older versions of this file
+    for other in os.listdir(cache_dir):
+        if other.startswith(f"{name}-") and os.path.join(cache_dir, other) != entry and ".tmp" not in other:
+            shutil.rmtree(os.path.join(cache_dir, other), ignore_errors=True)
+
+    stats["cached"] = False
+    return arrays, stats
+
+
+def to_feature_frame(arrays):
+    """DataFrame in FEATURE_COLUMNS order (can_id, dlc, byte_0..byte_7)."""
+    matrix = np.empty((len(arrays["can_id"]), len(FEATURE_COLUMNS)), dtype=np.int32)
+    matrix[:, 0] = arrays["can_id"]
+    matrix[:, 1] = arrays["dlc"]
+    matrix[:, 2:] = arrays["payload"]
+    return pd.DataFrame(matrix, columns=FEATURE_COLUMNS)
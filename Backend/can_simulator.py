@@ -0,0 +1,42 @@
+import random
+
+
+# Generate random simulated CAN data
+def generate_can_data(vehicle_id="Vehicle_001", healthy=None, rng=random):
+    """
+    Simulated CAN frame for the dashboard and benchmarks.
+    healthy=None picks at random (70% healthy, 30% anomaly); True/False
+    forces one profile. Pass a random.Random as rng for repeatable frames.
+    """
+    # 70% chance of healthy, 30% chance of anomaly
+    is_healthy = rng.random() < 0.7 if healthy is None else healthy
+
+    if is_healthy:
+        data = {
+            "vehicle_id": vehicle_id,
+            "can_id": rng.randint(0x100, 0x7FF),
+            "dlc": rng.randint(1, 8),
+            "byte_0": rng.randint(800, 3000),     # RPM
+            "byte_1": rng.randint(0, 60),         # Throttle %
+            "byte_2": rng.randint(0, 100),        # Brake Pressure
+            "byte_3": rng.randint(-20, 20),       # Steering Angle
+            "byte_4": rng.randint(0, 120),        # Speed km/h
+            "byte_5": rng.randint(30, 80),        # Fuel %
+            "byte_6": round(rng.uniform(11.5, 13.5), 2),  # Battery Voltage
+            "byte_7": rng.randint(1, 5),          # Gear
+        }
+    else:
+        data = {
+            "vehicle_id": vehicle_id,
+            "can_id": rng.randint(0x100, 0x7FF),
+            "dlc": rng.randint(1, 8),
+            "byte_0": rng.randint(7000, 9000),    # High RPM
+            "byte_1": rng.randint(90, 100),       # Throttle maxed
+            "byte_2": rng.randint(200, 255),      # Brake to max
+            "byte_3": rng.randint(-90, 90),       # Wild steering
+            "byte_4": rng.randint(180, 250),      # Over-speeding
+            "byte_5": rng.randint(0, 5),          # Fuel nearly empty
+            "byte_6": round(rng.uniform(5.0, 9.0), 2),   # Low battery
+            "byte_7": rng.randint(5, 6),          # High gear at low speed
+        }
+    return data
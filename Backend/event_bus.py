@@ -0,0 +1,93 @@
+import json
+import queue
+import threading
+
+
+def format_event(topic, data):
+    """Encode one Server-Sent Event."""
+    return f"event: {topic}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+class Subscriber:
+    """One listener's bounded inbox. Slow listeners lose their oldest events."""
+
+    def __init__(self, topics, max_pending):
+        self.topics = set(topics) if topics else None
+        self.events = queue.Queue(maxsize=max_pending)
+        self.dropped = 0
+
+    def wants(self, topic):
+        return self.topics is None or topic in self.topics
+
+    def offer(self, event):
+        while True:
+            try:
+                self.events.put_nowait(event)
+                return
+            except queue.Full:
+                try:
+                    self.events.get_nowait()
+                    self.dropped += 1
+                except queue.Empty:
+                    pass
+
+
+class EventBus:
+    """
+    In-process publish/subscribe for live dashboard updates.
+    publish() never blocks: each subscriber has its own bounded queue, so
+    one slow browser tab cannot hold up detection.
+    """
+
+    def __init__(self, max_pending=1000):
+        self.max_pending = max_pending
+        self._subscribers = set()
+        self._lock = threading.Lock()
+
+    def subscribe(self, topics=None):
+        return self.attach(Subscriber(topics, self.max_pending))
+
+    def attach(self, subscriber):
+        """Register any object with wants(topic) and offer(event) (see sse_server)."""
+        with self._lock:
+            self._subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def publish(self, topic, data):
+        subscribers = self.subscribers_for(topic)
+        if not subscribers:
+            return
+
+        # Serialize once, not once per subscriber
+        event = format_event(topic, data)
+        for subscriber in subscribers:
+            subscriber.offer(event)
+
+    def subscribers_for(self, topic):
+        with self._lock:
+            return [s for s in self._subscribers if s.wants(topic)]
+
+    def subscriber_count(self):
+        with self._lock:
+            return len(self._subscribers)
+
+    def has_subscribers(self):
+        """Whether a publish() can reach anyone; callers skip building events otherwise."""
+        return self.subscriber_count() > 0
+
+
+def sse_stream(bus, subscriber, heartbeat=15):
+    """Yield Server-Sent Events for a subscriber until the client goes away."""
+    try:
+        yield "retry: 3000\n\n"
+        while True:
+            try:
+                yield subscriber.events.get(timeout=heartbeat)
+            except queue.Empty:
+                yield ": keep-alive\n\n"
+    finally:
+        bus.unsubscribe(subscriber)
@@ -0,0 +1,72 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+def frame_signature(can_id, dlc, bytes_list, bucket=1):
+    """
+    Normalized cache key for a CAN frame.
+    Payload bytes are integer-bucketed (bucket=1 keeps the exact pattern),
+    so repeated DoS/impersonation frames map to the same key.
+    """
+    bucket = max(int(bucket), 1)
+    payload = tuple(int(float(b)) // bucket for b in bytes_list[:8])
+    return (int(can_id), int(dlc), payload)
+
+
+class ExplanationCache:
+    """
+    Thread-safe LRU cache with a time-to-live for parsed GPT explanations.
+    Values are the dicts /detect returns (attack_type, gpt_explanation,
+    suggested_patch). Hit/miss/eviction counts are kept for sizing.
+    """
+
+    def __init__(self, max_entries=4096, ttl=3600):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()   # key -> (stored_at, value), least recently used first
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        """Return the cached value for key, or None on a miss or expired entry."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.time() - entry[0] > self.ttl:
+                del self._entries[key]
+                entry = None
+
+            if entry is None:
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return dict(entry[1])
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.time(), dict(value))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0
+            }
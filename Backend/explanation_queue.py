@@ -0,0 +1,157 @@
+import os
+import queue
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from instrumentation import get_logger
+
+logger = get_logger("explanations")
+
+
+class ExplanationQueue:
+    """
+    Background worker pool for GPT threat explanations.
+
+    Anomalous frames are submitted with a key (the frame signature). Frames
+    with the same key that are still waiting share one ticket, so a flood of
+    identical frames costs one generation. When the bounded queue is full
+    new work is shed instead of blocking the caller.
+
+    Ticket statuses: pending -> done | error, or dropped when shed.
+    on_complete(ticket, contexts) is called once per ticket when it settles,
+    with the context of every frame that was coalesced into it.
+
+    With a store (shared_state.SharedTicketStore) every ticket change is
+    also written there, so other worker processes can answer get() for it.
+    """
+
+    def __init__(self, explain_fn, on_complete=None, workers=2, max_pending=256, ticket_ttl=600, store=None):
+        self.explain_fn = explain_fn
+        self.on_complete = on_complete
+        self.ticket_ttl = ticket_ttl
+        self.store = store
+        self.workers = workers
+        self.max_pending = max_pending
+
+        self._tickets = OrderedDict()   # ticket_id -> ticket dict, oldest first
+        self._pending = {}              # key -> ticket_id still waiting for a worker
+        self._contexts = {}             # ticket_id -> [context, ...]
+        self.stats = {"submitted": 0, "coalesced": 0, "dropped": 0, "completed": 0, "errors": 0}
+        self._start()
+
+        # Worker threads do not survive fork (gunicorn preload_app)
+        os.register_at_fork(after_in_child=self._start)
+
+    def _start(self):
+        self._queue = queue.Queue(maxsize=self.max_pending)
+        self._lock = threading.Lock()
+        self._settled = threading.Condition(self._lock)
+        self._pending.clear()
+        for i in range(self.workers):
+            threading.Thread(target=self._worker, name=f"explainer-{i}", daemon=True).start()
+
+    def submit(self, key, args, context=None):
+        """Queue args for explanation. Returns the ticket dict (a copy)."""
+        with self._lock:
+            self._prune()
+            self.stats["submitted"] += 1
+
+            ticket_id = self._pending.get(key)
+            if ticket_id is not None:
+                self.stats["coalesced"] += 1
+                self._contexts[ticket_id].append(context)
+                return dict(self._tickets[ticket_id])
+
+            ticket_id = uuid.uuid4().hex
+            ticket = {"ticket_id": ticket_id, "status": "pending", "result": None, "created": time.time()}
+            self._tickets[ticket_id] = ticket
+            self._contexts[ticket_id] = [context]
+
+            try:
+                self._queue.put_nowait((ticket_id, key, args))
+                self._pending[key] = ticket_id
+                self._share(ticket)
+                return dict(ticket)
+            except queue.Full:
+                self.stats["dropped"] += 1
+                ticket["status"] = "dropped"
+                contexts = self._contexts.pop(ticket_id)
+                self._share(ticket)
+
+        # Shed work is reported outside the lock, same as finished work
+        self._notify(ticket, contexts)
+        return dict(ticket)
+
+    def get(self, ticket_id, wait=0):
+        """
+        Return a ticket by id, optionally waiting up to `wait` seconds for it
+        to settle. Tickets this process does not know are looked up in the store.
+        """
+        deadline = time.time() + wait
+        with self._lock:
+            ticket = self._tickets.get(ticket_id)
+            if ticket is not None or self.store is None:
+                while ticket is not None and ticket["status"] == "pending":
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        break
+                    self._settled.wait(remaining)
+                return dict(ticket) if ticket is not None else None
+        return self.store.wait(ticket_id, deadline)
+
+    def depth(self):
+        return self._queue.qsize()
+
+    def _worker(self):
+        while True:
+            ticket_id, key, args = self._queue.get()
+            try:
+                # Stop coalescing into this ticket once generation starts
+                with self._lock:
+                    self._pending.pop(key, None)
+
+                try:
+                    result = self.explain_fn(*args)
+                    status = "done"
+                except Exception as e:
+                    result = {"error": str(e)}
+                    status = "error"
+
+                with self._lock:
+                    ticket = self._tickets.get(ticket_id)
+                    if ticket is None:
+                        continue
+                    ticket["status"] = status
+                    ticket["result"] = result
+                    self._share(ticket)
+                    self.stats["completed" if status == "done" else "errors"] += 1
+                    contexts = self._contexts.pop(ticket_id, [])
+                    self._settled.notify_all()
+
+                self._notify(ticket, contexts)
+            finally:
+                self._queue.task_done()
+
+    def _share(self, ticket):
+        """Copy a ticket to the store, if any. Caller holds the lock."""
+        if self.store is not None:
+            self.store.put(dict(ticket))
+
+    def _notify(self, ticket, contexts):
+        if self.on_complete is None:
+            return
+        try:
+            self.on_complete(dict(ticket), contexts)
+        except Exception as e:
+            logger.error("Explanation callback failed: %s", e)
+
+    def _prune(self):
+        """Forget settled tickets older than ticket_ttl. Caller holds the lock."""
+        cutoff = time.time() - self.ticket_ttl
+        while self._tickets:
+            ticket_id, ticket = next(iter(self._tickets.items()))
+            if ticket["created"] >= cutoff or ticket["status"] == "pending":
+                break
+            self._tickets.popitem(last=False)
@@ -0,0 +1,97 @@
+"""
+Export the trained models to ONNX for onnxruntime inference on CPU-only hosts.
+
+    python export_onnx.py            # both models
+    python export_onnx.py anomaly    # IsolationForest only
+    python export_onnx.py gpt        # distilgpt2 only
+
+Writes into model/onnx/ (see onnx_backend.py). The distilgpt2 graph is the
+logits-only forward pass with dynamic int8 weight quantization. Tree
+ensembles have no weights to quantize, so the IsolationForest is exported
+as-is. app.py uses the distilgpt2 graph when INFERENCE_BACKEND allows it;
+the IsolationForest graph only with INFERENCE_BACKEND=onnx, since the
+default forest_scorer path is faster per frame and matches sklearn exactly.
+"""
+import json
+import os
+import sys
+import time
+
+import joblib
+
+from onnx_backend import ONNX_DIR, ANOMALY_ONNX, GPT_ONNX
+
+
+def export_anomaly_model(pkl_path="./model/anomaly_model.pkl", out_path=ANOMALY_ONNX):
+    from skl2onnx import convert_sklearn
+    from skl2onnx.common.data_types import FloatTensorType
+    from can_parser import FEATURE_COLUMNS
+
+    model = joblib.load(pkl_path)
+    feature_names = list(getattr(model, "feature_names_in_", FEATURE_COLUMNS))
+
+    onx = convert_sklearn(
+        model,
+        initial_types=[("features", FloatTensorType([None, len(feature_names)]))],
+        target_opset={"": 15, "ai.onnx.ml": 3}
+    )
+    meta = onx.metadata_props.add()
+    meta.key = "feature_names"
+    meta.value = json.dumps(feature_names)
+
+    with open(out_path, "wb") as f:
+        f.write(onx.SerializeToString())
+    print(f"✅ IsolationForest exported to {out_path}")
+
+
+def export_gpt(model_path="./model/fine_tuned_distilgpt2", out_path=GPT_ONNX):
+    import torch
+    from onnxruntime.quantization import quantize_dynamic, QuantType
+    from transformers import GPT2LMHeadModel, GPT2TokenizerFast
+
+    class LogitsOnly(torch.nn.Module):
+        def __init__(self, model):
+            super().__init__()
+            self.model = model
+
+        def forward(self, input_ids, attention_mask):
+            return self.model(input_ids=input_ids, attention_mask=attention_mask, use_cache=False).logits
+
+    tokenizer = GPT2TokenizerFast.from_pretrained(model_path)
+    model = GPT2LMHeadModel.from_pretrained(model_path)
+    model.eval()
+
+    dummy = tokenizer(["CAN ID: 129, DLC: 8, Data: [0, 0, 0, 0, 0, 0, 0, 0]"], return_tensors="pt")
+    fp32_path = out_path.replace(".int8.onnx", ".onnx")
+    dynamic = {0: "batch", 1: "sequence"}
+
+    with torch.inference_mode():
+        torch.onnx.export(
+            LogitsOnly(model),
+            (dummy["input_ids"], dummy["attention_mask"]),
+            fp32_path,
+            input_names=["input_ids", "attention_mask"],
+            output_names=["logits"],
+            dynamic_axes={"input_ids": dynamic, "attention_mask": dynamic, "logits": dynamic},
+            opset_version=14
+        )
+    print(f"✅ distilgpt2 exported to {fp32_path}")
+
+    quantize_dynamic(fp32_path, out_path, weight_type=QuantType.QInt8)
+    print(f"✅ int8 quantized model saved to {out_path}")
+
+
+if __name__ == "__main__":
+    targets = sys.argv[1:] or ["anomaly", "gpt"]
+    os.makedirs(ONNX_DIR, exist_ok=True)
+
+    for target in targets:
+        start = time.time()
+        if target == "anomaly":
+            export_anomaly_model()
+        elif target == "gpt":
+            export_gpt()
+        else:
+            print(f"Unknown target: {target} (expected anomaly or gpt)")
+            continue
+        print(f"⏱ {target} export took {time.time() - start:.1f}s")
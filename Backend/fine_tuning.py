@@ -1,4 +1,5 @@
 import os
+import time
 import torch
 from transformers import (
     GPT2TokenizerFast,
@@ -8,6 +9,9 @@ from transformers import (
     DataCollatorForLanguageModeling
 )
 from datasets import Dataset
+from attack_templates import format_target
+from can_parser import load_otids_cached
+from model_registry import VERSIONS_DIR
 
 # Dataset file paths
 dataset_files = [
@@ -21,23 +25,7 @@ dataset_files = [
 # Patch + Explanation logic
 ########################################
 def get_patch_and_explanation_for_attack(attack_type, payload):
-    if attack_type == "DoS":
-        explanation = "A DoS attack floods the CAN bus with high-priority messages, preventing normal communication."
-        patch = "Activate the vehicle's security update to handle message overloads."
-    elif attack_type == "Fuzzy":
-        explanation = "A Fuzzy attack sends malformed or random data to confuse or crash ECUs."
-        patch = "Enable data validity checks to prevent unsafe reads."
-    elif attack_type == "Impersonation":
-        explanation = "An Impersonation attack uses spoofed IDs to mimic legitimate ECUs and inject malicious data."
-        patch = "Turn on ID verification to block unauthorized messages."
-    elif attack_type == "Attack_free":
-        explanation = "No attack detected. All vehicle systems appear to be operating normally."
-        patch = "No action needed – vehicle is normal."
-    else:
-        explanation = "Unknown attack type."
-        patch = "No patch suggestion available."
-
-    return f"Attack Type: {attack_type}\nExplanation: {explanation}\nSuggested Patch: {patch}"
+    return format_target(attack_type)
 
 ########################################
 # Load & Preprocess CAN data
@@ -52,36 +40,17 @@ def load_and_preprocess_data(dataset_paths):
 
         attack_type = os.path.basename(file_path).split("_")[0]
 
-        with open(file_path, 'r') as file:
-            lines = file.readlines()
+        # ✅ Target contains attack type, explanation, patch (same for every row of a file)
+        response = get_patch_and_explanation_for_attack(attack_type, None)
 
-        for line in lines:
-            line = line.strip()
-            if not line:
-                continue
-            parts = line.split()
-            if len(parts) < 7:
-                continue
+        arrays, stats = load_otids_cached(file_path)
+        if stats["errors"]:
+            print(f"[DEBUG] {file_path}: {stats['errors']} unparseable lines")
 
-            try:
-                can_id_hex = parts[3]
-                can_id = int(can_id_hex, 16)
-                dlc = int(parts[6])
-                data_bytes = parts[7:7 + dlc]
-                byte_values = [int(b, 16) for b in data_bytes]
-
-                while len(byte_values) < 8:
-                    byte_values.append(0)
-
-                # ✅ Input prompt contains only CAN data
-                prompt = f"CAN ID: {can_id}, DLC: {dlc}, Data: {byte_values}"
-
-                # ✅ Target contains attack type, explanation, patch
-                response = get_patch_and_explanation_for_attack(attack_type, byte_values)
-
-                data.append({"input_text": prompt, "target_text": response})
-            except Exception as e:
-                continue
+        for can_id, dlc, byte_values in zip(arrays["can_id"].tolist(), arrays["dlc"].tolist(), arrays["payload"].tolist()):
+            # ✅ Input prompt contains only CAN data
+            prompt = f"CAN ID: {can_id}, DLC: {dlc}, Data: {byte_values}"
+            data.append({"input_text": prompt, "target_text": response})
 
     return data
 
@@ -163,4 +132,9 @@ save_path = os.path.join(base_path, "model/fine_tuned_distilgpt2")
 trainer.save_model(save_path)
 tokenizer.save_pretrained(save_path)
 
+# Versioned copy that /models/distilgpt2/reload can switch to (model_registry.py)
+version_path = os.path.join(base_path, VERSIONS_DIR, f"distilgpt2-{time.strftime('%Y%m%d-%H%M%S')}")
+trainer.save_model(version_path)
+tokenizer.save_pretrained(version_path)
+
 print("✅ Fine-tuning complete!")
\ No newline at end of file
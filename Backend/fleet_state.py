@@ -0,0 +1,113 @@
+import threading
+import time
+import zlib
+from array import array
+from collections import OrderedDict
+
+FRAME_FIELDS = ["can_id", "dlc"] + [f"byte_{i}" for i in range(8)]
+
+
+class VehicleState:
+    """Compact per-vehicle record: latest frame in a float array plus counters."""
+
+    __slots__ = ("frame", "last_seen", "frames", "anomalies", "anomaly_rate", "last_verdict", "last_score")
+
+    def __init__(self):
+        self.frame = array("d", bytes(8 * len(FRAME_FIELDS)))
+        self.last_seen = 0.0
+        self.frames = 0
+        self.anomalies = 0
+        self.anomaly_rate = 0.0     # exponentially weighted, drives "health"
+        self.last_verdict = 0       # -1 anomaly, 1 normal, 0 not scored yet
+        self.last_score = 0.0
+
+
+def _plain(value):
+    return int(value) if value.is_integer() else value
+
+
+class FleetStateStore:
+    """
+    Thread-safe latest-state store for many vehicles.
+
+    Vehicles are spread over `shards` independently locked dicts so
+    concurrent requests for different vehicles rarely contend. Each shard
+    keeps its vehicles in least-recently-updated order and evicts the
+    stalest one past max_vehicles / shards, so memory stays bounded.
+    """
+
+    def __init__(self, shards=16, max_vehicles=100000, health_alpha=0.05):
+        self.shards = [OrderedDict() for _ in range(shards)]
+        self.locks = [threading.Lock() for _ in range(shards)]
+        self.shard_capacity = max(max_vehicles // shards, 1)
+        self.health_alpha = health_alpha
+
+    def _shard(self, vehicle_id):
+        return zlib.crc32(vehicle_id.encode()) % len(self.shards)
+
+    def update(self, vehicle_id, frame, prediction=None, score=None):
+        """Store the latest frame and, when given, the verdict for it."""
+        index = self._shard(vehicle_id)
+        shard = self.shards[index]
+        with self.locks[index]:
+            state = shard.get(vehicle_id)
+            if state is None:
+                state = shard[vehicle_id] = VehicleState()
+                if len(shard) > self.shard_capacity:
+                    shard.popitem(last=False)
+            else:
+                shard.move_to_end(vehicle_id)
+
+            for i, field in enumerate(FRAME_FIELDS):
+                state.frame[i] = float(frame.get(field, 0))
+            state.last_seen = time.time()
+            state.frames += 1
+
+            if prediction is not None:
+                is_anomaly = 1.0 if prediction == -1 else 0.0
+                state.anomalies += int(is_anomaly)
+                state.anomaly_rate += self.health_alpha * (is_anomaly - state.anomaly_rate)
+                state.last_verdict = int(prediction)
+                state.last_score = float(score) if score is not None else 0.0
+
+    def get(self, vehicle_id):
+        """Return the vehicle's state as a dict, or None if unknown."""
+        index = self._shard(vehicle_id)
+        with self.locks[index]:
+            state = self.shards[index].get(vehicle_id)
+            return self._as_dict(vehicle_id, state) if state is not None else None
+
+    def latest_frame(self, vehicle_id):
+        """The latest frame in /detect's input shape, or {} if unknown."""
+        index = self._shard(vehicle_id)
+        with self.locks[index]:
+            state = self.shards[index].get(vehicle_id)
+            if state is None:
+                return {}
+            return {"vehicle_id": vehicle_id, **{field: _plain(value) for field, value in zip(FRAME_FIELDS, state.frame)}}
+
+    def snapshot(self, offset=0, limit=1000):
+        """A page of vehicle states, ordered by vehicle_id."""
+        vehicle_ids = []
+        for index, shard in enumerate(self.shards):
+            with self.locks[index]:
+                vehicle_ids.extend(shard.keys())
+        vehicle_ids.sort()
+        states = (self.get(vehicle_id) for vehicle_id in vehicle_ids[offset:offset + limit])
+        return [state for state in states if state is not None]
+
+    def count(self):
+        return sum(len(shard) for shard in self.shards)
+
+    def _as_dict(self, vehicle_id, state):
+        verdict = {-1: "anomaly", 1: "normal"}.get(state.last_verdict, "unknown")
+        return {
+            "vehicle_id": vehicle_id,
+            "frame": {field: _plain(value) for field, value in zip(FRAME_FIELDS, state.frame)},
+            "last_seen": state.last_seen,
+            "frames": state.frames,
+            "anomalies": state.anomalies,
+            "health": round(1.0 - state.anomaly_rate, 4),
+            "last_verdict": verdict,
+            "last_score": state.last_score
+        }
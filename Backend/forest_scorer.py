@@ -0,0 +1,116 @@
+import numpy as np
+
+
+def _average_path_length(n_samples_leaf):
+    """Same formula (and float operations) as sklearn.ensemble._iforest._average_path_length."""
+    n = np.asarray(n_samples_leaf)
+    result = np.zeros(n.shape)
+    mask_1 = n <= 1
+    mask_2 = n == 2
+    rest = ~np.logical_or(mask_1, mask_2)
+    result[mask_2] = 1.0
+    result[rest] = 2.0 * (np.log(n[rest] - 1.0) + np.euler_gamma) - 2.0 * (n[rest] - 1.0) / n[rest]
+    return result
+
+
+class FlatIsolationForest:
+    """
+    Pure-NumPy scorer for a fitted sklearn IsolationForest.
+
+    All trees are flattened into contiguous node arrays (feature, threshold,
+    children) plus the per-node path length sklearn adds at each leaf.
+    Every tree is walked at once, one level per step, so a single frame
+    costs a handful of vectorised ops instead of sklearn's validation and
+    per-estimator loop. Leaves point back at themselves, so walking
+    max_depth levels always ends on a leaf.
+
+    Nodes are addressed by slot = 2 * node, with the arrays repeated per
+    slot: children[slot + went_left] is the next slot, which saves one
+    array op per level.
+
+    decision_function() matches sklearn bit for bit: inputs are rounded to
+    float32 like sklearn does, and tree depths are summed in tree order.
+    """
+
+    def __init__(self, model):
+        # Like sklearn, only models fitted on a DataFrame have feature names
+        if hasattr(model, "feature_names_in_"):
+            self.feature_names_in_ = model.feature_names_in_
+        self.n_features_in_ = model.n_features_in_
+        self.offset_ = model.offset_
+        self.n_trees = len(model.estimators_)
+        self.max_depth = max(tree.tree_.max_depth for tree in model.estimators_)
+
+        features, thresholds, children, values, roots = [], [], [], [], []
+        start = 0
+        subsample_features = model._max_features != model.n_features_in_
+        for tree, tree_features in zip(model.estimators_, model.estimators_features_):
+            t = tree.tree_
+            is_leaf = t.children_left == -1
+
+            feature = np.where(is_leaf, 0, t.feature).astype(np.intp)
+            if subsample_features:
+                feature = np.asarray(tree_features, dtype=np.intp)[feature]
+            nodes = np.arange(start, start + t.node_count)
+
+            left = np.where(is_leaf, nodes, t.children_left + start)
+            right = np.where(is_leaf, nodes, t.children_right + start)
+            # sklearn adds (depth + average path length - 1.0) per tree, root depth 1
+            value = (self._node_depths(t) + _average_path_length(t.n_node_samples)) - 1.0
+
+            features.append(np.repeat(feature, 2))
+            thresholds.append(np.repeat(np.where(is_leaf, np.inf, t.threshold), 2))
+            children.append(np.column_stack([right, left]).ravel() * 2)
+            values.append(np.repeat(value, 2))
+            roots.append(start * 2)
+            start += t.node_count
+
+        self.feature = np.concatenate(features)
+        self.threshold = np.concatenate(thresholds)
+        self.children = np.concatenate(children)
+        self.value = np.concatenate(values)
+        self.roots = np.asarray(roots, dtype=np.intp)
+        self.denominator = self.n_trees * _average_path_length([model._max_samples])[0]
+
+    @staticmethod
+    def _node_depths(tree):
+        depths = np.zeros(tree.node_count, dtype=np.float64)
+        depths[0] = 1.0
+        # Children always have higher ids than their parent
+        for node in range(tree.node_count):
+            left = tree.children_left[node]
+            if left != -1:
+                depths[left] = depths[node] + 1.0
+                depths[tree.children_right[node]] = depths[node] + 1.0
+        return depths
+
+    def score_samples(self, X):
+        """Opposite of the anomaly score; lower is more abnormal (as in sklearn)."""
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        n_samples = X.shape[0]
+        X = X.astype(np.float64).ravel()
+
+        slots = np.tile(self.roots, (n_samples, 1))
+        if n_samples == 1:
+            for _ in range(self.max_depth):
+                went_left = X.take(self.feature.take(slots)) <= self.threshold.take(slots)
+                slots = self.children.take(slots + went_left)
+        else:
+            row_offsets = (np.arange(n_samples) * self.n_features_in_)[:, None]
+            for _ in range(self.max_depth):
+                went_left = X.take(self.feature.take(slots) + row_offsets) <= self.threshold.take(slots)
+                slots = self.children.take(slots + went_left)
+
+        # cumsum adds left to right, the same order sklearn accumulates trees
+        depths = np.cumsum(self.value.take(slots), axis=1)[:, -1]
+        # A forest fitted on one sample has a zero denominator; sklearn uses 1
+        ratio = depths / self.denominator if self.denominator != 0 else np.ones(n_samples)
+        return -(2 ** -ratio)
+
+    def decision_function(self, X):
+        return self.score_samples(X) - self.offset_
+
+    def predict(self, X):
+        return np.where(self.decision_function(X) < 0, -1, 1)
@@ -0,0 +1,235 @@
+import os
+import queue
+import threading
+import time
+import weakref
+from concurrent.futures import Future
+from functools import partial
+
+import torch
+from transformers import StoppingCriteria, StoppingCriteriaList, TextIteratorStreamer
+
+from instrumentation import span
+
+
+class StopOnPattern(StoppingCriteria):
+    """Stop each sequence once its newly generated text matches `pattern` (a compiled regex)."""
+
+    def __init__(self, tokenizer, prompt_length, pattern):
+        self.tokenizer = tokenizer
+        self.prompt_length = prompt_length
+        self.pattern = pattern
+
+    def __call__(self, input_ids, scores, **kwargs):
+        texts = self.tokenizer.batch_decode(input_ids[:, self.prompt_length:], skip_special_tokens=True)
+        return torch.tensor([self.pattern.search(text) is not None for text in texts], device=input_ids.device)
+
+
+class StopOnEvent(StoppingCriteria):
+    """Stop every sequence once `event` is set (e.g. the client went away)."""
+
+    def __init__(self, event):
+        self.event = event
+
+    def __call__(self, input_ids, scores, **kwargs):
+        return torch.full((input_ids.shape[0],), self.event.is_set(), dtype=torch.bool, device=input_ids.device)
+
+
+def _restart_after_fork(ref):
+    batcher = ref()
+    if batcher is not None and not batcher._closed:
+        batcher._start()
+
+
+class GenerationBatcher:
+    """
+    Micro-batching front end for model.generate.
+
+    Callers block in generate(prompt, **kwargs) while a single collector
+    thread gathers prompts for up to max_wait_ms (or until max_batch_size
+    is reached), left-pads them, and runs one generate call per batch.
+    Prompts are only batched with others that use identical generation
+    kwargs. Returned text is decoded the same way as a single-prompt call.
+
+    Two extra kwargs are handled here rather than by model.generate:
+    stop_pattern (a compiled regex) ends each sequence once its new text
+    matches, and new_tokens_only=True returns the continuation without the
+    echoed prompt.
+
+    classify(prompt, classifier) goes through the same queue: concurrent
+    prompts are scored by an AttackClassifier in one forward pass, and no
+    classification competes with a generate call for the CPU.
+    """
+
+    def __init__(self, model, tokenizer, max_batch_size=16, max_wait_ms=10):
+        self.model = model
+        self.tokenizer = tokenizer
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+
+        # Decoder-only models must be padded on the left for generation
+        self.tokenizer.padding_side = "left"
+        if self.tokenizer.pad_token is None:
+            self.tokenizer.pad_token = self.tokenizer.eos_token
+
+        self.stats = {"requests": 0, "batches": 0, "max_batch_seen": 0, "new_tokens": 0, "classified": 0, "classify_batches": 0}
+        self._close_lock = threading.Lock()
+        self._closed = False
+        self._start()
+
+        # The collector thread does not survive fork (gunicorn preload_app).
+        # Weak reference, so a batcher closed after a model swap can be freed.
+        os.register_at_fork(after_in_child=partial(_restart_after_fork, weakref.ref(self)))
+
+    def _start(self):
+        self._queue = queue.Queue()
+        threading.Thread(target=self._collector, name="generation-batcher", daemon=True).start()
+
+    def generate(self, prompt, **generate_kwargs):
+        """Generate text for one prompt; blocks until its batch has run."""
+        return self._submit(prompt, generate_kwargs)
+
+    def classify(self, prompt, classifier):
+        """Best AttackClassifier label for one prompt; blocks until its batch has run."""
+        return self._submit(prompt, {"classifier": classifier})
+
+    def _submit(self, prompt, kwargs):
+        future = Future()
+        with self._close_lock:
+            queued = not self._closed
+            if queued:
+                self._queue.put((prompt, kwargs, future))
+        if not queued:
+            # Closed after a model swap: callers still holding this batcher run unbatched
+            self._run_group(dict(kwargs), [(prompt, future)])
+        return future.result()
+
+    def close(self):
+        """Stop the collector thread once the prompts already queued have run."""
+        with self._close_lock:
+            if not self._closed:
+                self._closed = True
+                self._queue.put(None)
+
+    def stream(self, prompt, stop_pattern=None, **generate_kwargs):
+        """
+        Generate for one prompt outside the batch, yielding decoded text as
+        tokens are produced. Generation ends when the new text matches
+        stop_pattern or when the caller stops iterating (closes the generator).
+        """
+        inputs = self.tokenizer(prompt, return_tensors="pt")
+        streamer = TextIteratorStreamer(self.tokenizer, skip_prompt=True, skip_special_tokens=True)
+        cancelled = threading.Event()
+        criteria = StoppingCriteriaList([StopOnEvent(cancelled)])
+        if stop_pattern is not None:
+            criteria.append(StopOnPattern(self.tokenizer, inputs["input_ids"].shape[1], stop_pattern))
+        errors = []
+
+        def run():
+            try:
+                with span("generate"), torch.inference_mode():
+                    self.model.generate(
+                        **inputs,
+                        pad_token_id=self.tokenizer.pad_token_id,
+                        streamer=streamer,
+                        stopping_criteria=criteria,
+                        **generate_kwargs
+                    )
+            except Exception as e:
+                errors.append(e)
+                streamer.end()
+
+        threading.Thread(target=run, name="generation-stream", daemon=True).start()
+        try:
+            yield from streamer
+        finally:
+            cancelled.set()
+        if errors:
+            raise errors[0]
+
+    def _collector(self):
+        while True:
+            first = self._queue.get()
+            if first is None:
+                return
+            batch = [first]
+            closing = False
+            deadline = time.time() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is None:
+                    closing = True
+                    break
+                batch.append(item)
+
+            # Split by generation settings; each group is one model call
+            groups = {}
+            for prompt, kwargs, future in batch:
+                key = tuple(sorted(kwargs.items()))
+                groups.setdefault(key, []).append((prompt, future))
+
+            for key, items in groups.items():
+                self._run_group(dict(key), items)
+            if closing:
+                return
+
+    def _run_group(self, kwargs, items):
+        if "classifier" in kwargs:
+            self._run_classify(kwargs["classifier"], items)
+        else:
+            self._run_batch(kwargs, items)
+
+    def _run_classify(self, classifier, items):
+        try:
+            labels = classifier.best_labels([prompt for prompt, _ in items])
+        except Exception as e:
+            for _, future in items:
+                future.set_exception(e)
+            return
+
+        self.stats["classified"] += len(items)
+        self.stats["classify_batches"] += 1
+        for (_, future), label in zip(items, labels):
+            future.set_result(label)
+
+    def _run_batch(self, generate_kwargs, items):
+        prompts = [prompt for prompt, _ in items]
+        stop_pattern = generate_kwargs.pop("stop_pattern", None)
+        new_tokens_only = generate_kwargs.pop("new_tokens_only", False)
+        try:
+            with span("tokenize"):
+                inputs = self.tokenizer(prompts, return_tensors="pt", padding=True)
+            prompt_length = inputs["input_ids"].shape[1]
+            if stop_pattern is not None:
+                generate_kwargs["stopping_criteria"] = StoppingCriteriaList([
+                    StopOnPattern(self.tokenizer, prompt_length, stop_pattern)
+                ])
+            with span("generate"), torch.inference_mode():
+                outputs = self.model.generate(
+                    **inputs,
+                    pad_token_id=self.tokenizer.pad_token_id,
+                    **generate_kwargs
+                )
+            with span("decode"):
+                texts = self.tokenizer.batch_decode(
+                    outputs[:, prompt_length:] if new_tokens_only else outputs,
+                    skip_special_tokens=True
+                )
+        except Exception as e:
+            for _, future in items:
+                future.set_exception(e)
+            return
+
+        # Finished sequences are padded to the longest one in the batch
+        self.stats["new_tokens"] += int((outputs[:, prompt_length:] != self.tokenizer.pad_token_id).sum())
+        self.stats["requests"] += len(items)
+        self.stats["batches"] += 1
+        self.stats["max_batch_seen"] = max(self.stats["max_batch_seen"], len(items))
+        for (_, future), text in zip(items, texts):
+            future.set_result(text)
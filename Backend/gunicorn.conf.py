@@ -0,0 +1,37 @@
+# gunicorn -c gunicorn.conf.py wsgi:app
+import multiprocessing
+import os
+
+bind = os.environ.get("BIND", "0.0.0.0:5000")
+
+# One worker per core by default; each worker gets cores // workers torch threads
+workers = int(os.environ.get("WEB_WORKERS", multiprocessing.cpu_count()))
+
+# Fleet state, explanation tickets and /stream events must be the same in
+# every worker, so with several workers they are kept in SQLite (shared_state.py)
+if workers > 1:
+    os.environ.setdefault("STATE_BACKEND", "sqlite")
+
+# Threads serve requests concurrently (sync GPT calls block one each)
+worker_class = "gthread"
+threads = int(os.environ.get("WEB_THREADS", 8))
+
+# /stream is served by an asyncio server in every worker, all bound to this
+# address (one coroutine per open dashboard instead of one of the threads
+# above). /stream on `bind` redirects to it on the same host, or to
+# STREAM_PUBLIC_URL when a proxy publishes it elsewhere. An empty
+# STREAM_BIND serves /stream from the request threads on `bind`.
+stream_bind = os.environ.get("STREAM_BIND", "0.0.0.0:5001")
+stream_public_url = os.environ.get("STREAM_PUBLIC_URL")
+
+# Load models in the master before fork (shared copy-on-write)
+preload_app = True
+
+# Sampled GPT explanations can take several seconds
+timeout = int(os.environ.get("WEB_TIMEOUT", 120))
+graceful_timeout = 30
+
+
+def post_fork(server, worker):
+    from app import init_worker
+    init_worker(workers, stream_bind, stream_public_url)
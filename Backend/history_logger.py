@@ -1,10 +1,152 @@
+import atexit
+import os
+import queue
 import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from instrumentation import metrics, span, get_logger
+
+logger = get_logger("history")
 
 DB_FILE = "../logs/threats.sqlite"
 
+# Group-commit settings for the background writer
+WRITE_BATCH_ROWS = 500      # commit once this many rows are waiting...
+WRITE_FLUSH_MS = 50         # ...or once the oldest row has waited this long
+READ_POOL_SIZE = 4
+
+_write_queue = queue.Queue()
+_writer_lock = threading.Lock()
+_writer_thread = None
+_read_pool = queue.Queue()
+_read_pool_lock = threading.Lock()
+_read_pool_created = 0
+
+THREAT_INSERT = '''
+    INSERT INTO threats (timestamp, ts_epoch, is_anomaly, vehicle_id, anomaly_score, attack, gpt_explanation, suggested_patch)
+    VALUES (datetime(?, 'unixepoch'), ?, ?, ?, ?, ?, ?, ?)
+'''
+
+THREAT_COLUMNS = "id, timestamp, ts_epoch, vehicle_id, anomaly_score, is_anomaly, attack, gpt_explanation, suggested_patch"
+
+PATCH_INSERT = '''
+    INSERT INTO applied_patches (timestamp, vehicle_id, patch)
+    VALUES (datetime('now'), ?, ?)
+'''
+
+
+def _connect():
+    """Open a connection in WAL mode so readers never block the writer."""
+    conn = sqlite3.connect(DB_FILE, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+def _writer():
+    """
+    Drain the write queue, committing every WRITE_BATCH_ROWS rows or
+    WRITE_FLUSH_MS. Each queue item is (sql, rows) and is never split
+    across commits, so rows queued together commit together.
+    """
+    conn = _connect()
+    while True:
+        batch = [_write_queue.get()]
+        row_count = len(batch[0][1])
+        deadline = time.time() + WRITE_FLUSH_MS / 1000.0
+        while row_count < WRITE_BATCH_ROWS:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                break
+            try:
+                item = _write_queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            batch.append(item)
+            row_count += len(item[1])
+
+        # Consecutive rows for the same statement go through one executemany
+        try:
+            with span("db_commit"), conn:
+                start = 0
+                while start < len(batch):
+                    sql = batch[start][0]
+                    end = start
+                    while end < len(batch) and batch[end][0] == sql:
+                        end += 1
+                    conn.executemany(sql, [params for _, rows in batch[start:end] for params in rows])
+                    start = end
+            metrics.increment("db_rows_written_total", row_count, "Rows committed by the history writer")
+        except sqlite3.Error as e:
+            logger.error("Failed to write %d rows: %s", row_count, e)
+        finally:
+            for _ in batch:
+                _write_queue.task_done()
+
+
+def _enqueue(sql, params):
+    _enqueue_many(sql, [params])
+
+
+def _enqueue_many(sql, rows):
+    """Queue rows for one statement; they are written in the same transaction."""
+    global _writer_thread
+    if not rows:
+        return
+    if _writer_thread is None:
+        with _writer_lock:
+            if _writer_thread is None:
+                _writer_thread = threading.Thread(target=_writer, name="history-writer", daemon=True)
+                _writer_thread.start()
+    _write_queue.put((sql, rows))
+
+
+def flush():
+    """Block until every queued row has been committed."""
+    if _writer_thread is not None:
+        _write_queue.join()
+
+
+atexit.register(flush)
+
+
+def _reset_after_fork():
+    """Threads and SQLite connections must not cross fork; the child starts fresh."""
+    global _write_queue, _writer_lock, _writer_thread, _read_pool, _read_pool_lock, _read_pool_created
+    _write_queue = queue.Queue()
+    _writer_lock = threading.Lock()
+    _writer_thread = None
+    _read_pool = queue.Queue()
+    _read_pool_lock = threading.Lock()
+    _read_pool_created = 0
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+@contextmanager
+def _read_connection():
+    """Borrow a pooled read connection."""
+    global _read_pool_created
+    try:
+        conn = _read_pool.get_nowait()
+    except queue.Empty:
+        with _read_pool_lock:
+            can_create = _read_pool_created < READ_POOL_SIZE
+            if can_create:
+                _read_pool_created += 1
+        conn = _connect() if can_create else _read_pool.get()
+    try:
+        yield conn
+    finally:
+        _read_pool.put(conn)
+
+
 def init_db():
     """Create threats table if not exists."""
-    conn = sqlite3.connect(DB_FILE)
+    conn = _connect()
     cursor = conn.cursor()
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS threats (
@@ -20,80 +162,104 @@ def init_db():
     conn.commit()
     conn.close()
 
-def log_threat(vehicle_id, anomaly_score, attack, gpt_explanation, suggested_patch):
-    """Log a detected security threat into the database, ensuring anomaly_score is stored as a float."""
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
+def migrate_db():
+    """
+    Bring an existing threats database up to the indexed schema:
+    integer epoch timestamps (ts_epoch), an is_anomaly flag, and indexes
+    for vehicle, time and anomaly lookups. Safe to run on every start.
+    """
+    init_db()
+    patch_logger()
+
+    conn = _connect()
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(threats)")}
+    with conn:
+        if "ts_epoch" not in columns:
+            conn.execute("ALTER TABLE threats ADD COLUMN ts_epoch INTEGER")
+            conn.execute("UPDATE threats SET ts_epoch = CAST(strftime('%s', timestamp) AS INTEGER)")
+        if "is_anomaly" not in columns:
+            conn.execute("ALTER TABLE threats ADD COLUMN is_anomaly INTEGER NOT NULL DEFAULT 0")
+            conn.execute("UPDATE threats SET is_anomaly = 1 WHERE anomaly_score = -1")
+
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_threats_ts ON threats (ts_epoch)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_threats_vehicle ON threats (vehicle_id, id)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_threats_anomaly ON threats (is_anomaly, id)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_patches_vehicle ON applied_patches (vehicle_id, id)")
+    conn.close()
 
+def _threat_row(vehicle_id, anomaly_score, attack, gpt_explanation, suggested_patch, is_anomaly=None):
     try:
         anomaly_score = float(anomaly_score)  # Ensure it's a float before inserting
     except ValueError:
         anomaly_score = 1.0  # Default value for invalid data
+    now = int(time.time())
+    # Without an explicit flag, negative scores (and the old -1 label) are anomalies
+    if is_anomaly is None:
+        is_anomaly = anomaly_score < 0
+    is_anomaly = int(bool(is_anomaly))
+    return (now, now, is_anomaly, vehicle_id, anomaly_score, attack, gpt_explanation, suggested_patch)
 
-    cursor.execute('''
-        INSERT INTO threats (timestamp, vehicle_id, anomaly_score, attack, gpt_explanation, suggested_patch)
-        VALUES (datetime('now'), ?, ?, ?, ?, ?)
-    ''', (vehicle_id, anomaly_score, attack, gpt_explanation, suggested_patch))
+def log_threat(vehicle_id, anomaly_score, attack, gpt_explanation, suggested_patch, is_anomaly=None):
+    """Queue a detected security threat for the background writer, storing anomaly_score as a float."""
+    _enqueue(THREAT_INSERT, _threat_row(vehicle_id, anomaly_score, attack, gpt_explanation, suggested_patch, is_anomaly))
 
-    conn.commit()
-    print(f"Threat logged: {vehicle_id}, {anomaly_score}, {attack}, {gpt_explanation}, {suggested_patch}")
-    conn.close()
+def log_threats(rows):
+    """Queue many (vehicle_id, anomaly_score, attack, gpt_explanation, suggested_patch[, is_anomaly]) rows; they commit together."""
+    _enqueue_many(THREAT_INSERT, [_threat_row(*row) for row in rows])
 
 
-def fetch_history(limit=10):
-    """Retrieve the last N detected threats."""
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    
-    cursor.execute('SELECT id, timestamp, vehicle_id, anomaly_score, attack, gpt_explanation, suggested_patch FROM threats ORDER BY timestamp DESC LIMIT ?', (limit,))
-    
-    # Fetch column names
-    columns = [desc[0] for desc in cursor.description]
+def _fetch_threats(limit, before, vehicle_id, anomalies_only):
+    """
+    Keyset-paginated read, newest first. `before` is the id cursor returned
+    by the previous page, so each page costs O(limit) on the indexes.
+    """
+    clauses, params = [], []
+    if anomalies_only:
+        clauses.append("is_anomaly = 1")
+    if vehicle_id is not None:
+        clauses.append("vehicle_id = ?")
+        params.append(vehicle_id)
+    if before is not None:
+        clauses.append("id < ?")
+        params.append(before)
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    params.append(limit)
+
+    with _read_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(f"SELECT {THREAT_COLUMNS} FROM threats {where} ORDER BY id DESC LIMIT ?", params)
+
+        # Fetch column names
+        columns = [desc[0] for desc in cursor.description]
+        rows = cursor.fetchall()
 
     # Convert rows to dictionaries
-    history = []
-    for row in cursor.fetchall():
-        row_dict = dict(zip(columns, row))
+    return [dict(zip(columns, row)) for row in rows]
 
-        # Ensure anomaly_score is always a float
+def next_cursor(rows, limit):
+    """Cursor for the page after `rows`, or None when this was the last page."""
+    return rows[-1]["id"] if len(rows) == limit and rows else None
+
+def fetch_history(limit=10, before=None, vehicle_id=None):
+    """Retrieve the last N detected threats, optionally before an id cursor and for one vehicle."""
+    history = _fetch_threats(limit, before, vehicle_id, anomalies_only=False)
+
+    # Ensure anomaly_score is always a float
+    for row_dict in history:
         try:
             row_dict["anomaly_score"] = float(row_dict["anomaly_score"])
         except (ValueError, TypeError):
             row_dict["anomaly_score"] = 1.0  # Default fallback value
 
-        history.append(row_dict)
-
-    conn.close()
     return history
 
-def fetch_threat_history(limit=10):
-    """Retrieve the last N detected threats with anomaly_score set to -1."""
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    
-    cursor.execute('''
-        SELECT id, timestamp, vehicle_id, anomaly_score, attack, gpt_explanation, suggested_patch 
-        FROM threats 
-        WHERE anomaly_score = -1 
-        ORDER BY timestamp DESC 
-        LIMIT ?
-    ''', (limit,))
-    
-    # Fetch column names
-    columns = [desc[0] for desc in cursor.description]
-
-    # Convert rows to dictionaries
-    history = []
-    for row in cursor.fetchall():
-        row_dict = dict(zip(columns, row))
-        history.append(row_dict)
-
-    conn.close()
-    return history
+def fetch_threat_history(limit=10, before=None, vehicle_id=None):
+    """Retrieve the last N anomalous detections, optionally before an id cursor and for one vehicle."""
+    return _fetch_threats(limit, before, vehicle_id, anomalies_only=True)
 
 def patch_logger():
     """Create applied_patches table if not exists."""
-    conn = sqlite3.connect(DB_FILE)
+    conn = _connect()
     cursor = conn.cursor()
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS applied_patches (
@@ -107,32 +273,26 @@ def patch_logger():
     conn.commit()
     conn.close()
 
-def log_patch(patch):
-    """Log a patch applied to a vehicle."""
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    cursor.execute('''
-        INSERT INTO applied_patches (timestamp, "001", patch)
-        VALUES (datetime('now'), ?, ?)
-    ''', (patch))
+def log_patch(patch, vehicle_id="001"):
+    """Queue a patch applied to a vehicle for the background writer."""
+    _enqueue(PATCH_INSERT, (vehicle_id, patch))
 
-    conn.commit()
-    print(f"Patch logged: {patch}")
-    conn.close()
+def log_patches(patch, vehicle_ids):
+    """Queue one patch applied to many vehicles; all rows commit in one transaction."""
+    _enqueue_many(PATCH_INSERT, [(vehicle_id, patch) for vehicle_id in vehicle_ids])
 
 def get_threat(timestamp):
     """Fetch the most recent threat for a vehicle."""
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    
-    cursor.execute('''
-        SELECT anomaly_score, attack, suggested_patch FROM threats
-        WHERE vehicle_id = 001
-        AND timestamp = ?
-    ''', (timestamp,))
-    
-    last_threat = cursor.fetchone()
-    conn.close()
+    with _read_connection() as conn:
+        cursor = conn.cursor()
+
+        cursor.execute('''
+            SELECT anomaly_score, attack, suggested_patch FROM threats
+            WHERE vehicle_id = 001
+            AND timestamp = ?
+        ''', (timestamp,))
+
+        last_threat = cursor.fetchone()
     
     return last_threat if last_threat else None
 
@@ -0,0 +1,115 @@
+import threading
+import time
+
+from instrumentation import get_logger
+
+logger = get_logger("startup")
+
+
+class LazyResource:
+    """
+    A heavy component (model, tokenizer, ...) that is built on first use.
+
+    get() runs the loader once, under a lock, and returns the cached
+    value afterwards. warm_up() starts the load in a background thread so
+    the server can answer liveness checks while it finishes. A failed load
+    is recorded and retried on the next get().
+
+    reload(version) builds another version in the background while get()
+    keeps returning the current one, then swaps it in with a single
+    assignment. Callers that already hold the old value finish with it;
+    release(old) is called after the swap to free what the old value owns.
+    The loader is called as loader(version), with version None at first.
+    """
+
+    def __init__(self, name, loader, release=None):
+        self.name = name
+        self._loader = loader
+        self._release = release
+        self._lock = threading.Lock()
+        self._value = None
+        self.loaded = False
+        self.loading = False
+        self.error = None
+        self.load_seconds = None
+        self.version = None
+        self.reloading = False
+        self.last_reload = None
+
+    def get(self):
+        if self.loaded:
+            return self._value
+        with self._lock:
+            if not self.loaded:
+                self.loading = True
+                start = time.time()
+                try:
+                    self._value = self._loader(None)
+                    self.version = "current"
+                    self.loaded = True
+                    self.error = None
+                    self.load_seconds = round(time.time() - start, 3)
+                    logger.info("Loaded %s in %ss", self.name, self.load_seconds)
+                except Exception as e:
+                    self.error = str(e)
+                    raise
+                finally:
+                    self.loading = False
+        return self._value
+
+    def warm_up(self):
+        """Load in a background thread; errors are kept in self.error."""
+        def run():
+            try:
+                self.get()
+            except Exception as e:
+                logger.error("Failed to load %s: %s", self.name, e)
+
+        threading.Thread(target=run, name=f"warm-up-{self.name}", daemon=True).start()
+
+    def reload(self, version=None):
+        """Load `version` in the background and swap it in. Returns False if a reload is already running."""
+        with self._lock:
+            if self.reloading:
+                return False
+            self.reloading = True
+
+        def run():
+            start = time.time()
+            try:
+                value = self._loader(version)
+            except Exception as e:
+                self.last_reload = {"version": version, "error": str(e), "finished": time.time()}
+                self.reloading = False
+                logger.error("Failed to reload %s (%s): %s", self.name, version, e)
+                return
+
+            with self._lock:
+                old, self._value = self._value, value
+                self.version = version or "current"
+                self.loaded = True
+                self.error = None
+                self.reloading = False
+            seconds = round(time.time() - start, 3)
+            self.last_reload = {"version": self.version, "seconds": seconds, "finished": time.time()}
+            logger.info("Swapped %s to %s (loaded in %ss)", self.name, self.version, seconds)
+
+            if old is not None and self._release is not None:
+                try:
+                    self._release(old)
+                except Exception as e:
+                    logger.error("Failed to release old %s: %s", self.name, e)
+
+        threading.Thread(target=run, name=f"reload-{self.name}", daemon=True).start()
+        return True
+
+    def status(self):
+        return {
+            "loaded": self.loaded,
+            "loading": self.loading,
+            "error": self.error,
+            "load_seconds": self.load_seconds,
+            "version": self.version,
+            "reloading": self.reloading,
+            "last_reload": self.last_reload
+        }
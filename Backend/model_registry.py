@@ -0,0 +1,49 @@
+import os
+
+# Versioned artifacts live next to the served ones:
+#   model/versions/anomaly-<timestamp>.pkl     (training.py)
+#   model/versions/distilgpt2-<timestamp>/     (fine_tuning.py)
+VERSIONS_DIR = "./model/versions"
+
+# Served ("current") artifact and version prefix for each registered model
+ARTIFACTS = {
+    "anomaly_model": {"current": "./model/anomaly_model.pkl", "prefix": "anomaly-", "suffix": ".pkl"},
+    "distilgpt2": {"current": "./model/fine_tuned_distilgpt2", "prefix": "distilgpt2-", "suffix": ""},
+}
+
+CURRENT = "current"
+
+
+def artifact_path(name, version=None):
+    """Path of a model version; None or "current" is the served artifact."""
+    artifact = ARTIFACTS[name]
+    if version in (None, CURRENT):
+        return artifact["current"]
+    if not version.startswith(artifact["prefix"]) or os.path.basename(version) != version:
+        raise ValueError(f"Unknown {name} version: {version}")
+    path = os.path.join(VERSIONS_DIR, version + artifact["suffix"])
+    if not os.path.exists(path):
+        raise ValueError(f"Unknown {name} version: {version}")
+    return path
+
+
+def list_versions(name):
+    """Available versions of a model, newest first (timestamps sort by name)."""
+    artifact = ARTIFACTS[name]
+    if not os.path.isdir(VERSIONS_DIR):
+        return []
+    versions = []
+    for entry in os.listdir(VERSIONS_DIR):
+        if entry.startswith(artifact["prefix"]) and entry.endswith(artifact["suffix"]):
+            versions.append(entry[:len(entry) - len(artifact["suffix"])] if artifact["suffix"] else entry)
+    return sorted(versions, reverse=True)
+
+
+def artifact_mtime(path):
+    """Last modification time of a file, or of the newest file in a directory."""
+    try:
+        if not os.path.isdir(path):
+            return os.path.getmtime(path)
+        return max((entry.stat().st_mtime for entry in os.scandir(path) if entry.is_file()), default=None)
+    except OSError:
+        return None
@@ -0,0 +1,92 @@
+import json
+import os
+import weakref
+from functools import partial
+from types import SimpleNamespace
+
+import numpy as np
+
+# Artifacts written by export_onnx.py
+ONNX_DIR = "./model/onnx"
+ANOMALY_ONNX = os.path.join(ONNX_DIR, "anomaly_model.onnx")
+GPT_ONNX = os.path.join(ONNX_DIR, "distilgpt2_logits.int8.onnx")
+
+
+def onnxruntime_available():
+    try:
+        import onnxruntime  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def _session(path):
+    import onnxruntime as ort
+
+    options = ort.SessionOptions()
+    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    return ort.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+
+
+def _reopen_after_fork(ref):
+    session = ref()
+    if session is not None:
+        session._open()
+
+
+class _ForkSafeSession:
+    """
+    onnxruntime's thread pool does not survive fork, so a session created
+    before gunicorn forks its workers is reopened in each child.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._open()
+        # Weak reference, so a session replaced by a model reload can be freed
+        os.register_at_fork(after_in_child=partial(_reopen_after_fork, weakref.ref(self)))
+
+    def _open(self):
+        self.session = _session(self.path)
+
+
+class OnnxIsolationForest(_ForkSafeSession):
+    """
+    onnxruntime stand-in for the sklearn IsolationForest.
+    Exposes decision_function() so app.score_frames can use either one.
+    The feature order is stored in the model metadata by export_onnx.py.
+    """
+
+    def __init__(self, path=ANOMALY_ONNX):
+        super().__init__(path)
+        self.input_name = self.session.get_inputs()[0].name
+        metadata = self.session.get_modelmeta().custom_metadata_map
+        self.feature_names_in_ = np.array(json.loads(metadata["feature_names"]), dtype=object)
+
+        # skl2onnx outputs (label, scores); scores match decision_function
+        self.score_output = self.session.get_outputs()[1].name
+
+    def decision_function(self, X):
+        X = np.ascontiguousarray(np.asarray(X, dtype=np.float32))
+        scores = self.session.run([self.score_output], {self.input_name: X})[0]
+        return scores.reshape(-1).astype(np.float64)
+
+
+class OnnxCausalLM(_ForkSafeSession):
+    """
+    onnxruntime stand-in for GPT2LMHeadModel's forward pass (logits only,
+    no KV cache). Used by AttackClassifier, which needs one forward pass
+    per frame; sampling still runs on the PyTorch model.
+    """
+
+    def __init__(self, path=GPT_ONNX):
+        super().__init__(path)
+
+    def __call__(self, input_ids, attention_mask):
+        import torch
+
+        logits = self.session.run(["logits"], {
+            "input_ids": input_ids.cpu().numpy().astype(np.int64),
+            "attention_mask": attention_mask.cpu().numpy().astype(np.int64)
+        })[0]
+        return SimpleNamespace(logits=torch.from_numpy(logits))
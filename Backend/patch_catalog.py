@@ -0,0 +1,65 @@
+"""
+Compiled catalog of simulated patches: patch ID -> 8-byte CAN opcode frame.
+
+encode_patch_to_can() used to re-run a chain of substring checks on
+every call. The keyword rules are now evaluated once per distinct patch
+text (and up front for the template patches in attack_templates.py), so
+a patch ID or a known patch text resolves with one dict lookup.
+"""
+from functools import lru_cache
+
+from attack_templates import ATTACK_TEMPLATES
+
+# (patch ID, keywords that must all appear in the patch text, opcode bytes).
+# Checked in order, so earlier rules win when a text matches several.
+PATCH_RULES = [
+    ("ids_monitor", ("ids", "monitor"), (0x02, 0xB1, 0x01)),             # ENABLE_IDS, CAN_MONITOR, ACTIVE_MONITORING
+    ("overload_throttle", ("security update", "overload"), (0x03, 0xA2, 0x02)),  # THROTTLING MODE, NETWORK CONTROL MODULE, OVERLOAD HANDLER
+    ("data_validation", ("data validity",), (0x04, 0xC3, 0x01)),        # VALIDATION MODULE
+    ("id_verification", ("id verification",), (0x05, 0xD4, 0x01)),      # AUTH MODULE
+]
+
+
+def _frame(opcode):
+    """Pad an opcode to the byte_0..byte_7 dict the frontend displays."""
+    padded = tuple(opcode) + (0x00,) * (8 - len(opcode))
+    return {f"byte_{i}": value for i, value in enumerate(padded)}
+
+
+PATCH_CATALOG = {patch_id: _frame(opcode) for patch_id, _, opcode in PATCH_RULES}
+
+
+@lru_cache(maxsize=1024)
+def _match_rules(text):
+    for patch_id, keywords, _ in PATCH_RULES:
+        if all(keyword in text for keyword in keywords):
+            return patch_id
+    return None
+
+
+# Patch text from the templates (what /detect suggests) -> patch ID
+PATCH_TEXT_INDEX = {}
+for _, template_patch in ATTACK_TEMPLATES.values():
+    template_patch_id = _match_rules(template_patch.lower())
+    if template_patch_id is not None:
+        PATCH_TEXT_INDEX[template_patch.lower()] = template_patch_id
+
+
+def resolve_patch_id(patch_text):
+    """Catalog ID for a patch ID or free-form patch text, or None if nothing matches."""
+    if patch_text in PATCH_CATALOG:
+        return patch_text
+    text = patch_text.lower()
+    patch_id = PATCH_TEXT_INDEX.get(text)
+    return patch_id if patch_id is not None else _match_rules(text)
+
+
+def encode_patch_to_can(patch_text):
+    """
+    CAN byte-style frame for a patch ID or patch text. Text that matches no
+    catalog entry falls back to its first 8 characters (ord(c) % 256).
+    """
+    patch_id = resolve_patch_id(patch_text)
+    if patch_id is not None:
+        return dict(PATCH_CATALOG[patch_id])
+    return {f"byte_{i}": ord(c) % 256 for i, c in enumerate(patch_text.lower()[:8])}
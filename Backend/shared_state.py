@@ -0,0 +1,344 @@
+"""
+State shared by gunicorn worker processes (STATE_BACKEND=sqlite).
+
+Each worker is a separate process, so the in-memory fleet store,
+explanation tickets and event bus would each only see the requests that
+worker served. These drop-in replacements keep that state in tables of
+the threats database instead. Their writes go through the history
+writer's queue, so they never block a request and are group-committed
+with the threat rows.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from event_bus import EventBus, format_event
+from fleet_state import FRAME_FIELDS, _plain
+from history_logger import _connect, _enqueue, _enqueue_many, _read_connection
+from instrumentation import get_logger
+
+logger = get_logger("shared_state")
+
+# Seconds between polls for rows written by other workers
+POLL_INTERVAL = 0.1
+
+# Seconds between a worker's /stream subscriber counts in stream_listeners,
+# and how long a count is trusted (a worker that exited stops refreshing it)
+LISTENER_HEARTBEAT = 2
+LISTENER_TTL = 5
+
+SCHEMA = [
+    '''
+    CREATE TABLE IF NOT EXISTS fleet_state (
+        vehicle_id TEXT PRIMARY KEY,
+        frame TEXT,
+        last_seen REAL,
+        frames INTEGER,
+        anomalies INTEGER,
+        anomaly_rate REAL,
+        last_verdict INTEGER,
+        last_score REAL
+    )
+    ''',
+    "CREATE INDEX IF NOT EXISTS idx_fleet_last_seen ON fleet_state (last_seen)",
+    '''
+    CREATE TABLE IF NOT EXISTS explanation_tickets (
+        ticket_id TEXT PRIMARY KEY,
+        status TEXT,
+        result TEXT,
+        created REAL
+    )
+    ''',
+    "CREATE INDEX IF NOT EXISTS idx_tickets_created ON explanation_tickets (created)",
+    '''
+    CREATE TABLE IF NOT EXISTS stream_events (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        created REAL,
+        topic TEXT,
+        event TEXT
+    )
+    ''',
+    "CREATE INDEX IF NOT EXISTS idx_events_created ON stream_events (created)",
+    '''
+    CREATE TABLE IF NOT EXISTS stream_listeners (
+        pid INTEGER PRIMARY KEY,
+        subscribers INTEGER,
+        updated REAL
+    )
+    '''
+]
+
+
+def init_shared_state():
+    """Create the shared tables. Safe to run on every start."""
+    conn = _connect()
+    with conn:
+        for statement in SCHEMA:
+            conn.execute(statement)
+    conn.close()
+
+
+class _ProcessThread:
+    """A daemon thread started on first use in each process; threads do not survive fork."""
+
+    def __init__(self, target, name):
+        self.target = target
+        self.name = name
+        self._lock = threading.Lock()
+        self._pid = None
+
+    def ensure(self):
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+        threading.Thread(target=self.target, name=self.name, daemon=True).start()
+
+
+class _Pruner:
+    """Queues a cleanup statement at most once per interval."""
+
+    def __init__(self, sql, interval=60):
+        self.sql = sql
+        self.interval = interval
+        self.last = 0.0
+
+    def maybe(self, params):
+        now = time.time()
+        if now - self.last >= self.interval:
+            self.last = now
+            _enqueue(self.sql, params)
+
+
+FLEET_UPSERT = '''
+    INSERT INTO fleet_state (vehicle_id, frame, last_seen, frames, anomalies, anomaly_rate, last_verdict, last_score)
+    VALUES (?1, ?2, ?3, ?4, ?5, ?6, COALESCE(?7, 0), COALESCE(?8, 0))
+    ON CONFLICT(vehicle_id) DO UPDATE SET
+        frame = excluded.frame,
+        last_seen = excluded.last_seen,
+        frames = frames + excluded.frames,
+        anomalies = anomalies + excluded.anomalies,
+        anomaly_rate = anomaly_rate * ?9 + excluded.anomaly_rate,
+        last_verdict = COALESCE(?7, last_verdict),
+        last_score = COALESCE(?8, last_score)
+'''
+
+FLEET_COLUMNS = "vehicle_id, frame, last_seen, frames, anomalies, anomaly_rate, last_verdict, last_score"
+
+# Seconds a worker merges fleet updates before queueing them
+FLEET_FLUSH_INTERVAL = 0.05
+
+
+class SharedFleetState:
+    """
+    FleetStateStore backed by the fleet_state table.
+
+    Each worker merges its updates per vehicle for FLEET_FLUSH_INTERVAL
+    and writes one row per vehicle, so a vehicle streaming frames costs a
+    few UPSERTs a second rather than one per frame. The exponentially
+    weighted anomaly rate is merged as rate * decay + added (a chain of
+    EWMA steps composes to one such step), so the stored rate matches
+    FleetStateStore however updates were split between workers or
+    batches. Past max_vehicles the least recently seen vehicles are
+    deleted (checked once a minute).
+    """
+
+    def __init__(self, max_vehicles=100000, health_alpha=0.05):
+        self.max_vehicles = max_vehicles
+        self.health_alpha = health_alpha
+        self._pending = {}  # vehicle_id -> [frame, last_seen, frames, anomalies, added, verdict, score, decay]
+        self._lock = threading.Lock()
+        self._flusher = _ProcessThread(self._flush, "fleet-flusher")
+        self._pruner = _Pruner('''
+            DELETE FROM fleet_state WHERE vehicle_id IN
+                (SELECT vehicle_id FROM fleet_state ORDER BY last_seen DESC LIMIT -1 OFFSET ?)
+        ''')
+
+    def update(self, vehicle_id, frame, prediction=None, score=None):
+        """Merge the latest frame and, when given, the verdict for it into the next write."""
+        values = [float(frame.get(field, 0)) for field in FRAME_FIELDS]
+        self._flusher.ensure()
+        with self._lock:
+            state = self._pending.get(vehicle_id)
+            if state is None:
+                state = self._pending[vehicle_id] = [None, 0.0, 0, 0, 0.0, None, None, 1.0]
+            state[0] = values
+            state[1] = time.time()
+            state[2] += 1
+            if prediction is not None:
+                is_anomaly = 1 if prediction == -1 else 0
+                state[3] += is_anomaly
+                state[4] = state[4] * (1 - self.health_alpha) + self.health_alpha * is_anomaly
+                state[5] = int(prediction)
+                state[6] = float(score) if score is not None else 0.0
+                state[7] *= 1 - self.health_alpha
+
+    def _flush(self):
+        while True:
+            time.sleep(FLEET_FLUSH_INTERVAL)
+            with self._lock:
+                pending, self._pending = self._pending, {}
+            if pending:
+                _enqueue_many(FLEET_UPSERT, [
+                    (vehicle_id, json.dumps(state[0]), *state[1:]) for vehicle_id, state in pending.items()
+                ])
+                self._pruner.maybe((self.max_vehicles,))
+
+    def _select(self, where, params):
+        with _read_connection() as conn:
+            return conn.execute(f"SELECT {FLEET_COLUMNS} FROM fleet_state {where}", params).fetchall()
+
+    def get(self, vehicle_id):
+        """Return the vehicle's state as a dict, or None if unknown."""
+        rows = self._select("WHERE vehicle_id = ?", (vehicle_id,))
+        return self._as_dict(rows[0]) if rows else None
+
+    def latest_frame(self, vehicle_id):
+        """The latest frame in /detect's input shape, or {} if unknown."""
+        state = self.get(vehicle_id)
+        return {"vehicle_id": vehicle_id, **state["frame"]} if state is not None else {}
+
+    def snapshot(self, offset=0, limit=1000):
+        """A page of vehicle states, ordered by vehicle_id."""
+        rows = self._select("ORDER BY vehicle_id LIMIT ? OFFSET ?", (limit, offset))
+        return [self._as_dict(row) for row in rows]
+
+    def count(self):
+        with _read_connection() as conn:
+            return conn.execute("SELECT COUNT(*) FROM fleet_state").fetchone()[0]
+
+    def _as_dict(self, row):
+        vehicle_id, frame, last_seen, frames, anomalies, anomaly_rate, last_verdict, last_score = row
+        return {
+            "vehicle_id": vehicle_id,
+            "frame": {field: _plain(value) for field, value in zip(FRAME_FIELDS, json.loads(frame))},
+            "last_seen": last_seen,
+            "frames": frames,
+            "anomalies": anomalies,
+            "health": round(1.0 - anomaly_rate, 4),
+            "last_verdict": {-1: "anomaly", 1: "normal"}.get(last_verdict, "unknown"),
+            "last_score": last_score
+        }
+
+
+TICKET_UPSERT = '''
+    INSERT OR REPLACE INTO explanation_tickets (ticket_id, status, result, created)
+    VALUES (?, ?, ?, ?)
+'''
+
+
+class SharedTicketStore:
+    """
+    Explanation tickets for ExplanationQueue(store=...), so a ticket
+    issued by one worker can be fetched (and long-polled) from any other.
+    Tickets older than ticket_ttl are deleted, including ones left
+    pending by a worker that exited.
+    """
+
+    def __init__(self, ticket_ttl=600):
+        self.ticket_ttl = ticket_ttl
+        self._pruner = _Pruner("DELETE FROM explanation_tickets WHERE created < ?")
+
+    def put(self, ticket):
+        _enqueue(TICKET_UPSERT, (
+            ticket["ticket_id"], ticket["status"], json.dumps(ticket["result"]), ticket["created"]
+        ))
+        self._pruner.maybe((time.time() - self.ticket_ttl,))
+
+    def fetch(self, ticket_id):
+        with _read_connection() as conn:
+            row = conn.execute(
+                "SELECT ticket_id, status, result, created FROM explanation_tickets WHERE ticket_id = ?", (ticket_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        return {"ticket_id": row[0], "status": row[1], "result": json.loads(row[2]), "created": row[3]}
+
+    def wait(self, ticket_id, deadline):
+        """
+        Poll until the ticket has settled or the deadline passes. A ticket
+        issued moments ago may not be committed yet, so an unknown id is
+        also polled for until the deadline.
+        """
+        while True:
+            ticket = self.fetch(ticket_id)
+            if (ticket is not None and ticket["status"] != "pending") or time.time() >= deadline:
+                return ticket
+            time.sleep(min(POLL_INTERVAL, max(deadline - time.time(), 0)))
+
+
+class SharedEventBus(EventBus):
+    """
+    EventBus whose events reach the subscribers of every worker process.
+    publish() serializes the event once and queues it as a stream_events
+    row; each process with subscribers runs a thread that tails the table
+    and fans new rows out to its own subscribers. Rows are kept for
+    `retention` seconds.
+
+    Those threads also keep their process's subscriber count in
+    stream_listeners, so while no dashboard is connected to any worker
+    nothing is written at all.
+    """
+
+    def __init__(self, max_pending=1000, retention=60):
+        super().__init__(max_pending)
+        self.retention = retention
+        self._pruner = _Pruner("DELETE FROM stream_events WHERE created < ?")
+        self._tail = _ProcessThread(self._tail_events, "stream-tail")
+        self._listeners = False
+        self._listeners_checked = 0.0
+
+    def attach(self, subscriber):
+        self._tail.ensure()
+        subscriber = super().attach(subscriber)
+        self._heartbeat()
+        return subscriber
+
+    def publish(self, topic, data):
+        if not self.has_subscribers():
+            return
+        _enqueue("INSERT INTO stream_events (created, topic, event) VALUES (?, ?, ?)",
+                 (time.time(), topic, format_event(topic, data)))
+        self._pruner.maybe((time.time() - self.retention,))
+
+    def has_subscribers(self):
+        """Whether any worker has a subscriber; other workers' counts are re-read at most once a second."""
+        if self.subscriber_count():
+            return True
+        now = time.time()
+        if now - self._listeners_checked >= 1:
+            self._listeners_checked = now
+            with _read_connection() as conn:
+                self._listeners = conn.execute(
+                    "SELECT EXISTS (SELECT 1 FROM stream_listeners WHERE subscribers > 0 AND updated > ?)",
+                    (now - LISTENER_TTL,)
+                ).fetchone()[0] == 1
+        return self._listeners
+
+    def _heartbeat(self):
+        _enqueue("INSERT OR REPLACE INTO stream_listeners (pid, subscribers, updated) VALUES (?, ?, ?)",
+                 (os.getpid(), self.subscriber_count(), time.time()))
+
+    def _tail_events(self):
+        conn = _connect()
+        last_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM stream_events").fetchone()[0]
+        last_heartbeat = time.time()
+        while True:
+            time.sleep(POLL_INTERVAL)
+            if time.time() - last_heartbeat >= LISTENER_HEARTBEAT:
+                last_heartbeat = time.time()
+                self._heartbeat()
+            try:
+                rows = conn.execute(
+                    "SELECT id, topic, event FROM stream_events WHERE id > ? ORDER BY id", (last_id,)
+                ).fetchall()
+            except sqlite3.Error as e:
+                logger.error("Failed to read stream events: %s", e)
+                continue
+            for last_id, topic, event in rows:
+                for subscriber in self.subscribers_for(topic):
+                    subscriber.offer(event)
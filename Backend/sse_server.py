@@ -0,0 +1,102 @@
+import asyncio
+import threading
+
+from aiohttp import web
+
+from instrumentation import get_logger
+
+logger = get_logger("sse")
+
+SSE_HEADERS = {
+    "Content-Type": "text/event-stream",
+    "Cache-Control": "no-cache",
+    "X-Accel-Buffering": "no",
+    "Access-Control-Allow-Origin": "*"
+}
+
+
+class AsyncSubscriber:
+    """
+    EventBus subscriber whose bounded inbox lives on the SSE event loop.
+    offer() is called from publishing threads and hands the event over
+    with call_soon_threadsafe; slow listeners lose their oldest events.
+    """
+
+    def __init__(self, topics, max_pending, loop):
+        self.topics = set(topics) if topics else None
+        self.events = asyncio.Queue(maxsize=max_pending)
+        self.dropped = 0
+        self.loop = loop
+
+    def wants(self, topic):
+        return self.topics is None or topic in self.topics
+
+    def offer(self, event):
+        self.loop.call_soon_threadsafe(self._put, event)
+
+    def _put(self, event):
+        if self.events.full():
+            self.events.get_nowait()
+            self.dropped += 1
+        self.events.put_nowait(event)
+
+
+def make_app(bus, heartbeat=15):
+    """aiohttp app serving GET /stream?topics=... from an EventBus."""
+
+    async def stream(request):
+        topics = [topic for topic in request.query.get("topics", "").split(",") if topic]
+        subscriber = bus.attach(AsyncSubscriber(topics or None, bus.max_pending, asyncio.get_running_loop()))
+        response = web.StreamResponse(headers=SSE_HEADERS)
+        try:
+            await response.prepare(request)
+            await response.write(b"retry: 3000\n\n")
+            while True:
+                try:
+                    event = await asyncio.wait_for(subscriber.events.get(), heartbeat)
+                except asyncio.TimeoutError:
+                    event = ": keep-alive\n\n"
+                await response.write(event.encode())
+        except ConnectionResetError:
+            pass  # client went away
+        finally:
+            bus.unsubscribe(subscriber)
+        return response
+
+    app = web.Application()
+    app.router.add_get("/stream", stream)
+    return app
+
+
+def start_sse_server(bus, host, port):
+    """
+    Serve /stream on host:port from an asyncio loop in a daemon thread.
+    Each open stream is a coroutine rather than a server thread, so
+    dashboards can stay connected without starving the WSGI threads.
+    The port is bound with SO_REUSEPORT, so every gunicorn worker serves
+    it and the kernel spreads connections between them.
+    Returns once the port is bound; raises OSError if it cannot be.
+    """
+    started = threading.Event()
+    errors = []
+
+    def run():
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        # handler_cancellation: a closed tab ends its coroutine (and subscription) at once
+        runner = web.AppRunner(make_app(bus), access_log=None, handler_cancellation=True)
+        try:
+            loop.run_until_complete(runner.setup())
+            loop.run_until_complete(web.TCPSite(runner, host, port, reuse_port=True).start())
+        except OSError as e:
+            errors.append(e)
+            return
+        finally:
+            started.set()
+        logger.info("Serving /stream on %s:%d", host, port)
+        loop.run_forever()
+
+    threading.Thread(target=run, name="sse-server", daemon=True).start()
+    started.wait()
+    if errors:
+        raise errors[0]
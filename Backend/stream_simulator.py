@@ -1,48 +1,174 @@
-import requests
-import time
+import argparse
+import asyncio
 import sys
-import re
+import time
+
+import aiohttp
+
+from can_parser import iter_otids_chunks
+
+DEFAULT_URL = "http://127.0.0.1:5000"
+
+
+def iter_frames(filepath, limit=None):
+    """Yield (timestamp, frame dict) pairs from an OTIDS file in file order."""
+    sent = 0
+    for chunk in iter_otids_chunks(filepath):
+        payloads = chunk["payload"].tolist()
+        for timestamp, can_id, dlc, payload in zip(chunk["timestamp"].tolist(), chunk["can_id"].tolist(),
+                                                   chunk["dlc"].tolist(), payloads):
+            frame = {"can_id": can_id, "dlc": dlc, "timestamp": timestamp}
+            frame.update({f"byte_{i}": payload[i] for i in range(8)})
+            yield timestamp, frame
+            sent += 1
+            if limit is not None and sent >= limit:
+                return
+
 
-# ✅ Function to extract 8 CAN bytes from a line
-def parse_can_line(line):
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(int(round(pct / 100.0 * (len(sorted_values) - 1))), len(sorted_values) - 1)
+    return sorted_values[index]
+
+
+class ReplayStats:
+    def __init__(self):
+        self.frames = 0
+        self.requests = 0
+        self.anomalies = 0
+        self.errors = 0
+        self.latencies = []
+        self.started = time.perf_counter()
+
+    def report(self):
+        elapsed = time.perf_counter() - self.started
+        latencies = sorted(self.latencies)
+        return {
+            "frames": self.frames,
+            "requests": self.requests,
+            "anomalies": self.anomalies,
+            "errors": self.errors,
+            "elapsed_s": round(elapsed, 3),
+            "frames_per_s": round(self.frames / elapsed, 1) if elapsed else 0.0,
+            "latency_ms": {
+                "p50": round(percentile(latencies, 50) * 1000, 2),
+                "p95": round(percentile(latencies, 95) * 1000, 2),
+                "p99": round(percentile(latencies, 99) * 1000, 2),
+                "max": round(latencies[-1] * 1000, 2) if latencies else 0.0
+            }
+        }
+
+
+async def _post(session, url, payload, frame_count, stats, semaphore, verbose):
+    start = time.perf_counter()
     try:
-        if "Timestamp:" not in line or "DLC:" not in line:
-            return None
-
-        matches = re.findall(r'\b[0-9a-fA-F]{2}\b', line)
-        if len(matches) >= 8:
-            return {f"byte_{i}": int(matches[i], 16) for i in range(8)}
-    except:
-        return None
-
-# ✅ Stream function
-def stream_dataset(filepath, delay=0.2):
-    with open(filepath, 'r') as f:
-        print(f"🚗 Starting stream from: {filepath}")
-        for line in f:
-            data = parse_can_line(line)
-            if not data:
-                continue
-
-            try:
-                response = requests.post("http://127.0.0.1:5000/detect", json=data)
-                result = response.json()
-                print(f"📤 Sent: {data}")
-                print(f"🧠 Result: {result['result']}")
-
-                if result["result"] == "anomaly":
-                    print(f"⚠️ Threat Explanation: {result['gpt_explanation']}")
-                    print(f"🔧 Suggested Patch: {result['suggested_patch']}\n")
-
-                time.sleep(delay)  # Simulate real-time data flow
-            except Exception as e:
-                print(f"❌ Error: {e}")
-                continue
-
-import re
+        async with session.post(url, json=payload) as response:
+            result = await response.json()
+        stats.latencies.append(time.perf_counter() - start)
+        stats.requests += 1
+        stats.frames += frame_count
+
+        if "error" in result:
+            stats.errors += 1
+        elif "results" in result:
+            stats.anomalies += result.get("anomalies", 0)
+        elif result.get("result") == "anomaly":
+            stats.anomalies += 1
+            if verbose:
+                print(f"⚠️ {payload.get('vehicle_id')}: {result.get('attack_type')} - {result.get('suggested_patch')}")
+    except Exception as e:
+        stats.errors += 1
+        if verbose:
+            print(f"❌ Error: {e}")
+    finally:
+        semaphore.release()
+
+
+async def replay(filepath, url=DEFAULT_URL, mode="max", speed=1.0, concurrency=32,
+                 batch_size=0, vehicles=1, limit=None, verbose=False):
+    """
+    Replay an OTIDS file against the detection API.
+
+    mode: "realtime" follows the original timestamps, "speed" follows them
+    `speed` times faster, "max" sends as fast as the server accepts.
+    Each simulated vehicle sends every frame. With batch_size > 0 frames go
+    to /detect_batch in groups, otherwise one /detect call per frame.
+    At most `concurrency` requests are in flight at once.
+    """
+    if mode == "realtime":
+        speed = 1.0
+    vehicle_ids = [f"Vehicle_{i + 1:03d}" for i in range(vehicles)]
+    endpoint = f"{url}/detect_batch" if batch_size else f"{url}/detect"
+
+    stats = ReplayStats()
+    semaphore = asyncio.Semaphore(concurrency)
+    tasks = set()
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    timeout = aiohttp.ClientTimeout(total=60)
+
+    async def send(payload, frame_count):
+        await semaphore.acquire()
+        task = asyncio.create_task(_post(session, endpoint, payload, frame_count, stats, semaphore, verbose))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+        print(f"🚗 Replaying {filepath} -> {endpoint} ({mode}, {vehicles} vehicle(s), concurrency {concurrency})")
+        first_ts = None
+        batch = []
+
+        for timestamp, frame in iter_frames(filepath, limit):
+            if mode != "max":
+                if first_ts is None:
+                    first_ts = timestamp
+                    stats.started = time.perf_counter()
+                delay = stats.started + (timestamp - first_ts) / speed - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+
+            for vehicle_id in vehicle_ids:
+                if batch_size:
+                    batch.append({**frame, "vehicle_id": vehicle_id})
+                    if len(batch) >= batch_size:
+                        await send({"frames": batch}, len(batch))
+                        batch = []
+                else:
+                    await send({**frame, "vehicle_id": vehicle_id}, 1)
+
+        if batch:
+            await send({"frames": batch}, len(batch))
+        if tasks:
+            await asyncio.gather(*tasks)
+
+    return stats.report()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay an OTIDS dataset against the detection API.")
+    parser.add_argument("dataset_file")
+    parser.add_argument("--url", default=DEFAULT_URL)
+    parser.add_argument("--mode", choices=["realtime", "speed", "max"], default="max")
+    parser.add_argument("--speed", type=float, default=1.0, help="timestamp speed-up for --mode speed")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--batch", type=int, default=0, help="frames per /detect_batch call (0 = use /detect)")
+    parser.add_argument("--vehicles", type=int, default=1)
+    parser.add_argument("--limit", type=int, default=None, help="stop after this many file frames")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args(argv)
+
+    report = asyncio.run(replay(args.dataset_file, args.url, args.mode, args.speed, args.concurrency,
+                                args.batch, args.vehicles, args.limit, args.verbose))
+
+    print(f"📊 {report['frames']} frames in {report['elapsed_s']}s -> {report['frames_per_s']} frames/s "
+          f"({report['anomalies']} anomalies, {report['errors']} errors)")
+    latency = report["latency_ms"]
+    print(f"⏱ latency p50 {latency['p50']} ms, p95 {latency['p95']} ms, p99 {latency['p99']} ms, max {latency['max']} ms")
+    return report
+
 
 if __name__ == "__main__":
     if len(sys.argv) < 2:
-        print("Usage: python stream_simulator.py [dataset_file.txt]")
+        print("Usage: python stream_simulator.py [dataset_file.txt] [--mode realtime|speed|max] [--batch N] ...")
     else:
-        stream_dataset(sys.argv[1])
+        main()
@@ -1,6 +1,7 @@
-from google import genai
-
 def getResponse( contents, api_key = "", model = "gemini-2.0-flash"):
+    # Imported on use so importing this module (app.py does) stays cheap
+    from google import genai
+
     client = genai.Client(api_key=api_key)
     response = client.models.generate_content(
         model=model,
@@ -0,0 +1,149 @@
+import json
+import math
+import os
+import threading
+import time
+
+from instrumentation import get_logger
+
+logger = get_logger("thresholds")
+
+# Response tiers for a decision_function score (lower = more anomalous)
+NORMAL = "normal"      # score >= anomaly: not logged as a threat
+SUSPECT = "suspect"    # explain <= score < anomaly: logged, no GPT explanation
+OUTLIER = "outlier"    # score < explain: logged and explained
+
+DEFAULT_LIMITS = {"anomaly": 0.0, "explain": -0.02}
+
+
+def _parse_can_id(key):
+    return int(key, 16) if str(key).lower().startswith("0x") else int(key)
+
+
+def _check_limits(where, limits):
+    """An entry must be an object of finite numbers keyed by DEFAULT_LIMITS names."""
+    if not isinstance(limits, dict):
+        raise ValueError(f"{where}: expected an object like {{\"anomaly\": 0.0}}, got {limits!r}")
+    for key, value in limits.items():
+        if key not in DEFAULT_LIMITS:
+            raise ValueError(f"{where}: unknown limit {key!r}")
+        if isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value):
+            raise ValueError(f"{where}.{key}: expected a number, got {value!r}")
+    return dict(limits)
+
+
+def _check_order(where, limits):
+    if limits["explain"] > limits["anomaly"]:
+        raise ValueError(f"{where}: explain ({limits['explain']}) is above anomaly ({limits['anomaly']})")
+
+
+def _parse_config(config):
+    """Validate a threshold file and return (default, vehicles, can_ids)."""
+    if not isinstance(config, dict):
+        raise ValueError("expected a JSON object")
+    default = {**DEFAULT_LIMITS, **_check_limits("default", config.get("default", {}))}
+
+    sections = {}
+    for name in ("vehicles", "can_ids"):
+        section = config.get(name, {})
+        if not isinstance(section, dict):
+            raise ValueError(f"{name}: expected an object")
+        sections[name] = {key: _check_limits(f"{name}.{key}", value) for key, value in section.items()}
+    vehicles = sections["vehicles"]
+    can_ids = {_parse_can_id(key): value for key, value in sections["can_ids"].items()}
+
+    # Every combination limits() can produce must keep explain <= anomaly
+    _check_order("default", default)
+    for can_id, can_limits in can_ids.items():
+        _check_order(f"can_ids.{hex(can_id)}", {**default, **can_limits})
+    for vehicle_id, vehicle_limits in vehicles.items():
+        _check_order(f"vehicles.{vehicle_id}", {**default, **vehicle_limits})
+        if len(vehicle_limits) < len(DEFAULT_LIMITS):
+            for can_id, can_limits in can_ids.items():
+                _check_order(f"vehicles.{vehicle_id} with can_ids.{hex(can_id)}", {**default, **can_limits, **vehicle_limits})
+    return default, vehicles, can_ids
+
+
+class ThresholdTable:
+    """
+    Score thresholds per vehicle and per CAN ID, read from a JSON file:
+
+        {
+          "default":  {"anomaly": 0.0, "explain": -0.02},
+          "vehicles": {"Vehicle_001": {"explain": -0.05}},
+          "can_ids":  {"0x316": {"anomaly": 0.01}}
+        }
+
+    A vehicle entry wins over a CAN ID entry, which wins over the default;
+    missing keys fall back to the next level. The file is re-read when its
+    mtime changes (checked at most every check_interval seconds), so edits
+    take effect without a restart. A file with a non-numeric limit, or an
+    explain limit above its anomaly limit, is rejected and the previous
+    table stays in use.
+    """
+
+    def __init__(self, path, check_interval=2.0):
+        self.path = path
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._mtime = None
+        self._next_check = 0.0
+        self._default = dict(DEFAULT_LIMITS)
+        self._vehicles = {}
+        self._can_ids = {}
+        self.reload()
+
+    def reload(self):
+        """Re-read the file now. Keeps the previous table if the file is invalid."""
+        try:
+            mtime = os.path.getmtime(self.path)
+            with open(self.path) as f:
+                config = json.load(f)
+            default, vehicles, can_ids = _parse_config(config)
+        except FileNotFoundError:
+            mtime, default, vehicles, can_ids = None, dict(DEFAULT_LIMITS), {}, {}
+        except (OSError, ValueError) as e:
+            logger.error("Invalid threshold file %s: %s", self.path, e)
+            return False
+
+        with self._lock:
+            self._mtime = mtime
+            self._default, self._vehicles, self._can_ids = default, vehicles, can_ids
+        logger.info("Loaded thresholds: %d vehicle and %d CAN ID overrides", len(vehicles), len(can_ids))
+        return True
+
+    def _maybe_reload(self):
+        now = time.monotonic()
+        if now < self._next_check:
+            return
+        self._next_check = now + self.check_interval
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            mtime = None
+        if mtime != self._mtime:
+            self.reload()
+
+    def limits(self, vehicle_id, can_id):
+        """Return {"anomaly": ..., "explain": ...} for a frame."""
+        self._maybe_reload()
+        with self._lock:
+            limits = dict(self._default)
+            limits.update(self._can_ids.get(int(can_id), {}))
+            limits.update(self._vehicles.get(vehicle_id, {}))
+        return limits
+
+    def tier(self, vehicle_id, can_id, score):
+        limits = self.limits(vehicle_id, can_id)
+        if score >= limits["anomaly"]:
+            return NORMAL
+        return OUTLIER if score < limits["explain"] else SUSPECT
+
+    def snapshot(self):
+        self._maybe_reload()
+        with self._lock:
+            return {
+                "default": dict(self._default),
+                "vehicles": dict(self._vehicles),
+                "can_ids": {hex(can_id): value for can_id, value in self._can_ids.items()}
+            }
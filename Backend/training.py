@@ -0,0 +1,245 @@
+"""
+Training CLI for the IsolationForest anomaly model and the RandomForest classifier.
+
+    python training.py anomaly                        # full retrain on the OTIDS files
+    python training.py forest --jobs 8 --max-samples 0.5
+    python training.py anomaly --warm-start --add-trees 20 --data ../data/new_capture.txt
+
+The OTIDS files are parsed in parallel processes (each one fills the
+can_parser .npy cache, which the trainer then memory-maps) and the trees
+are fitted on all cores. --warm-start loads the current model and only
+fits --add-trees new trees on the given data, keeping the model's feature
+layout and (for the anomaly model) its sample size and threshold.
+
+Every run is saved as model/versions/<model>-<timestamp>.pkl next to a
+.json with its parameters, data and timings. Full retrains are then
+promoted to the path app.py loads (unless --no-promote); warm starts only
+with --promote, once the saved version has been checked.
+"""
+import argparse
+import json
+import os
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import joblib
+import pandas as pd
+from sklearn.ensemble import IsolationForest, RandomForestClassifier
+
+from can_parser import FEATURE_COLUMNS, file_digest, load_otids_cached
+from model_registry import VERSIONS_DIR
+from train_model import USE_WINDOW_FEATURES, extract_features_from_file
+from train_random_forest import parse_can_file
+from window_features import WINDOW_COLUMNS
+
+OTIDS_FILES = [
+    "../data/Attack_free_dataset.txt",
+    "../data/DoS_attack_dataset.txt",
+    "../data/Fuzzy_attack_dataset.txt",
+    "../data/Impersonation_attack_dataset.txt"
+]
+
+MODEL_PATHS = {
+    "anomaly": "./model/anomaly_model.pkl",
+    "forest": "./model/random_forest_model.pkl"
+}
+
+CONTAMINATION = 0.03
+
+
+def _warm_cache(path):
+    """Process-pool task: parse one file into the .npy cache."""
+    start = time.time()
+    arrays, stats = load_otids_cached(path)
+    return {"rows": int(len(arrays["can_id"])), "cached": stats.get("cached", False), "seconds": round(time.time() - start, 3)}
+
+
+def file_label(path):
+    """RandomForest label: 0 for attack-free captures, 1 for attacks."""
+    return 0 if os.path.basename(path).startswith("Attack_free") else 1
+
+
+def load_training_data(kind, paths, jobs, window_features):
+    """Parse every file in parallel, then build one training DataFrame from the caches."""
+    missing = [path for path in paths if not os.path.exists(path)]
+    for path in missing:
+        print(f"❌ File not found: {path}")
+    paths = [path for path in paths if path not in missing]
+    if not paths:
+        return None, {}
+
+    with ProcessPoolExecutor(max_workers=max(1, min(jobs, len(paths)))) as pool:
+        parsed = dict(zip(paths, pool.map(_warm_cache, paths)))
+
+    if kind == "anomaly":
+        frames = [extract_features_from_file(path, window_features) for path in paths]
+    else:
+        frames = [parse_can_file(path, label=file_label(path)) for path in paths]
+    frames = [df for df in frames if not df.empty]
+    if not frames:
+        return None, parsed
+    return pd.concat(frames, ignore_index=True), parsed
+
+
+def model_uses_window_features(model):
+    """Whether a fitted anomaly model expects WINDOW_COLUMNS after the frame features."""
+    columns = getattr(model, "feature_names_in_", None)
+    if columns is not None:
+        return all(column in columns for column in WINDOW_COLUMNS)
+    return model.n_features_in_ == len(FEATURE_COLUMNS) + len(WINDOW_COLUMNS)
+
+
+def build_model(kind, args):
+    """A new estimator, or the current model set up to add trees (--warm-start)."""
+    if args.warm_start:
+        model = joblib.load(MODEL_PATHS[kind])
+        params = {"warm_start": True, "n_estimators": model.n_estimators + args.add_trees, "n_jobs": args.jobs}
+        if kind == "anomaly":
+            # New trees draw as many rows as the existing ones, so path lengths stay comparable
+            params["max_samples"] = model._max_samples
+        model.set_params(**params)
+        return model
+
+    max_samples = args.max_samples
+    if kind == "anomaly":
+        return IsolationForest(
+            n_estimators=args.n_estimators,
+            max_samples=max_samples if max_samples is not None else "auto",
+            contamination=CONTAMINATION,
+            n_jobs=args.jobs,
+            random_state=42
+        )
+    return RandomForestClassifier(
+        n_estimators=args.n_estimators,
+        max_samples=max_samples,
+        n_jobs=args.jobs,
+        random_state=42
+    )
+
+
+def fit_model(model, X, y, warm_start):
+    """
+    Fit the model, or its added trees with --warm-start. IsolationForest.fit
+    recomputes _max_samples (the path-length normaliser shared by all trees)
+    and offset_ (the contamination threshold) from X alone, so warm-starting
+    on a small capture would shift every score and the threshold with it;
+    those keep the values the existing trees were calibrated with.
+    """
+    if not (warm_start and isinstance(model, IsolationForest)):
+        return model.fit(X, y)
+    calibration = {"_max_samples": model._max_samples, "offset_": model.offset_}
+    if len(X) < calibration["_max_samples"]:
+        print(f"⚠️ Only {len(X)} rows: the new trees are shallower than the "
+              f"existing ones ({calibration['_max_samples']} rows each)")
+    model.fit(X)
+    for name, value in calibration.items():
+        setattr(model, name, value)
+    return model
+
+
+def save_version(kind, model, meta, promote, started):
+    """Write model/versions/<kind>-<timestamp>.pkl + .json and optionally promote it."""
+    save_start = time.time()
+    os.makedirs(VERSIONS_DIR, exist_ok=True)
+    version = f"{kind}-{time.strftime('%Y%m%d-%H%M%S')}"
+    model_path = os.path.join(VERSIONS_DIR, f"{version}.pkl")
+    joblib.dump(model, model_path)
+
+    if promote:
+        # Copy then rename, so a running server never loads a half-written file
+        target = MODEL_PATHS[kind]
+        tmp_path = f"{target}.tmp{os.getpid()}"
+        shutil.copyfile(model_path, tmp_path)
+        os.replace(tmp_path, target)
+
+    meta["version"] = version
+    meta["promoted"] = promote
+    meta["timings"]["save_seconds"] = round(time.time() - save_start, 3)
+    meta["timings"]["total_seconds"] = round(time.time() - started, 3)
+    with open(os.path.join(VERSIONS_DIR, f"{version}.json"), "w") as f:
+        json.dump(meta, f, indent=2)
+    return version, model_path
+
+
+def parse_max_samples(value):
+    if value is None:
+        return None
+    return float(value) if "." in value else int(value)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Train the CAN anomaly models.")
+    parser.add_argument("model", choices=sorted(MODEL_PATHS))
+    parser.add_argument("--data", nargs="+", default=OTIDS_FILES, help="OTIDS-format capture files")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count() or 1, help="processes for parsing, cores for fitting")
+    parser.add_argument("--n-estimators", type=int, default=100)
+    parser.add_argument("--max-samples", type=parse_max_samples, default=None,
+                        help="rows per tree (int) or fraction (float); IsolationForest default is 256")
+    parser.add_argument("--warm-start", action="store_true", help="add trees to the current model instead of retraining")
+    parser.add_argument("--add-trees", type=int, default=10, help="trees to add with --warm-start")
+    parser.add_argument("--window-features", action=argparse.BooleanOptionalAction, default=None,
+                        help="anomaly model only: append per-CAN-ID window features "
+                             "(default: train_model.USE_WINDOW_FEATURES, or the current model's layout with --warm-start)")
+    parser.add_argument("--promote", action=argparse.BooleanOptionalAction, default=None,
+                        help="replace the served model with this version (default: yes, except with --warm-start)")
+    args = parser.parse_args(argv)
+
+    timings = {}
+    start = time.time()
+    model = build_model(args.model, args)
+    window_features = args.window_features if args.window_features is not None else USE_WINDOW_FEATURES
+    if args.model == "anomaly" and args.warm_start:
+        window_features = model_uses_window_features(model)
+        if args.window_features not in (None, window_features):
+            parser.error(f"--warm-start: {MODEL_PATHS[args.model]} was trained "
+                         f"{'with' if window_features else 'without'} window features")
+    promote = args.promote if args.promote is not None else not args.warm_start
+
+    print(f"🔍 Parsing {len(args.data)} files with {args.jobs} processes...")
+    df, parsed = load_training_data(args.model, args.data, args.jobs, window_features)
+    timings["parse_seconds"] = round(time.time() - start, 3)
+    if df is None:
+        print("🚫 No valid data. Exiting.")
+        return None
+    print(f"📊 Total training samples: {len(df)} ({timings['parse_seconds']}s)")
+
+    if args.model == "forest":
+        X, y = df.drop(columns=["label"]), df["label"]
+    else:
+        X, y = df, None
+
+    trees_before = len(getattr(model, "estimators_", []))
+    print(f"🧠 Fitting {type(model).__name__} on {args.jobs} cores "
+          f"({'adding ' + str(args.add_trees) + ' trees' if args.warm_start else str(args.n_estimators) + ' trees'})...")
+    fit_start = time.time()
+    fit_model(model, X, y, args.warm_start)
+    timings["fit_seconds"] = round(time.time() - fit_start, 3)
+
+    # Serve single frames without a thread pool, and never grow the saved model by accident
+    model.set_params(n_jobs=None, warm_start=False)
+
+    meta = {
+        "model": args.model,
+        "estimator": type(model).__name__,
+        "params": {key: value for key, value in model.get_params().items() if isinstance(value, (int, float, str, bool, type(None)))},
+        "samples": len(X),
+        "features": list(X.columns),
+        "trees": len(model.estimators_),
+        "trees_added": len(model.estimators_) - trees_before,
+        "warm_start": args.warm_start,
+        "data": {path: {**info, "digest": file_digest(path)} for path, info in parsed.items()},
+        "timings": timings
+    }
+
+    version, model_path = save_version(args.model, model, meta, promote, start)
+
+    print(f"✅ Saved {model_path} ({meta['trees']} trees)"
+          f"{' and promoted to ' + MODEL_PATHS[args.model] if promote else ''}")
+    print(f"⏱ parse {timings['parse_seconds']}s, fit {timings['fit_seconds']}s, "
+          f"save {timings['save_seconds']}s, total {timings['total_seconds']}s")
+    return version
+
+
+if __name__ == "__main__":
+    main()
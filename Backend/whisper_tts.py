@@ -3,8 +3,14 @@ import os
 import speech_recognition as sr
 from pydub import AudioSegment
 
-# Initialize TTS engine
-tts_engine = pyttsx3.init()
+# TTS engine is initialized on first use (pyttsx3.init() is slow)
+tts_engine = None
+
+def get_tts_engine():
+    global tts_engine
+    if tts_engine is None:
+        tts_engine = pyttsx3.init()
+    return tts_engine
 
 def convert_audio(input_path, output_format="wav"):
     """Convert audio file to WAV format for compatibility with SpeechRecognition."""
@@ -48,8 +54,9 @@ def transcribe_audio(audio_path):
 def generate_speech(text, output_path="../data/output_speech.wav"):
     """Convert text to speech and save as an audio file."""
     try:
-        tts_engine.save_to_file(text, output_path)
-        tts_engine.runAndWait()
+        engine = get_tts_engine()
+        engine.save_to_file(text, output_path)
+        engine.runAndWait()
         return output_path
     except Exception as e:
         return f"Error generating speech: {e}"
@@ -0,0 +1,124 @@
+import math
+from collections import OrderedDict
+
+import numpy as np
+
+# Extra per-frame features appended after FEATURE_COLUMNS when a model is
+# trained with window features (see train_model.USE_WINDOW_FEATURES)
+WINDOW_COLUMNS = ["iat", "iat_mean", "iat_std", "frame_rate", "payload_entropy"]
+
+DEFAULT_WINDOW = 32
+
+# Standard CAN has 2048 IDs; extended IDs beyond that evict the stalest one
+DEFAULT_MAX_IDS = 2048
+
+
+class _IdState:
+    """Rolling state for one CAN ID: ring buffers plus running sums."""
+
+    __slots__ = ("last_ts", "iats", "payloads", "pos", "count",
+                 "iat_sum", "iat_sq_sum", "byte_counts", "byte_total", "clogc")
+
+    def __init__(self, window):
+        self.last_ts = None
+        self.iats = [0.0] * window
+        self.payloads = [None] * window
+        self.pos = 0
+        self.count = 0
+        self.iat_sum = 0.0
+        self.iat_sq_sum = 0.0
+        self.byte_counts = [0] * 256
+        self.byte_total = 0
+        self.clogc = 0.0        # sum of c * log(c) over byte_counts, for O(1) entropy
+
+
+def _clogc(c):
+    return c * math.log(c) if c > 0 else 0.0
+
+
+class WindowFeatureEngine:
+    """
+    Incremental per-CAN-ID window statistics, O(1) per frame.
+
+    For each CAN ID it keeps the last `window` inter-arrival times and
+    payloads in ring buffers with running sums, giving the inter-arrival
+    mean/std, the frame rate over the window, and the Shannon entropy
+    (bits) of the payload bytes seen in the window. DoS floods show up as
+    a collapsing inter-arrival time, fuzzing as high payload entropy.
+    At most max_ids CAN IDs are tracked; the least recently seen is dropped.
+    """
+
+    def __init__(self, window=DEFAULT_WINDOW, max_ids=DEFAULT_MAX_IDS):
+        self.window = window
+        self.max_ids = max_ids
+        self._states = OrderedDict()
+
+    def update(self, can_id, timestamp, payload):
+        """Add one frame and return its WINDOW_COLUMNS values as a list."""
+        state = self._states.get(can_id)
+        if state is None:
+            state = self._states[can_id] = _IdState(self.window)
+            if len(self._states) > self.max_ids:
+                self._states.popitem(last=False)
+        else:
+            self._states.move_to_end(can_id)
+
+        iat = 0.0 if state.last_ts is None else max(timestamp - state.last_ts, 0.0)
+        state.last_ts = timestamp
+
+        slot = state.pos
+        if state.count == self.window:
+            # Evict the oldest interval and payload from the running sums
+            old_iat = state.iats[slot]
+            state.iat_sum -= old_iat
+            state.iat_sq_sum -= old_iat * old_iat
+            self._count_bytes(state, state.payloads[slot], -1)
+        else:
+            state.count += 1
+
+        state.iats[slot] = iat
+        state.iat_sum += iat
+        state.iat_sq_sum += iat * iat
+        payload = bytes(int(b) & 0xFF for b in payload[:8])
+        state.payloads[slot] = payload
+        self._count_bytes(state, payload, 1)
+        state.pos = (slot + 1) % self.window
+
+        n = state.count
+        mean = state.iat_sum / n
+        var = max(state.iat_sq_sum / n - mean * mean, 0.0)
+        frame_rate = n / state.iat_sum if state.iat_sum > 0 else 0.0
+
+        total = state.byte_total
+        entropy = (math.log(total) - state.clogc / total) / math.log(2) if total else 0.0
+
+        return [iat, mean, math.sqrt(var), frame_rate, max(entropy, 0.0)]
+
+    @staticmethod
+    def _count_bytes(state, payload, delta):
+        counts = state.byte_counts
+        for b in payload:
+            c = counts[b]
+            state.clogc += _clogc(c + delta) - _clogc(c)
+            counts[b] = c + delta
+        state.byte_total += delta * len(payload)
+
+    def reset(self):
+        self._states.clear()
+
+
+def compute_window_features(arrays, window=DEFAULT_WINDOW):
+    """
+    Run the engine over parsed OTIDS columns (see can_parser) in file order.
+    Returns a float64 matrix with one WINDOW_COLUMNS row per frame.
+    """
+    engine = WindowFeatureEngine(window)
+    n = len(arrays["can_id"])
+    out = np.empty((n, len(WINDOW_COLUMNS)), dtype=np.float64)
+
+    can_ids = arrays["can_id"].tolist()
+    timestamps = arrays["timestamp"].tolist()
+    payloads = arrays["payload"].tolist()
+    for i in range(n):
+        out[i] = engine.update(can_ids[i], timestamps[i], payloads[i])
+    return out
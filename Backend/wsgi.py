@@ -0,0 +1,16 @@
+"""
+Production entry point.
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+gunicorn.conf.py preloads this module in the master process, so the
+anomaly model and distilgpt2 are loaded once before fork and shared
+copy-on-write by every worker. Loading must finish before fork, so warm
+startup is promoted to eager here; STARTUP_MODE=lazy still loads per worker.
+"""
+import os
+
+if os.environ.get("STARTUP_MODE") != "lazy":
+    os.environ["STARTUP_MODE"] = "eager"
+
+from app import app  # noqa: E402
@@ -55,12 +55,29 @@ function Main() {
     return () => clearInterval(interval);
   }, []);
 
+  // Outliers come back with a pending ticket; long-poll it until the GPT
+  // explanation settles, unless a newer detection has replaced it meanwhile
+  const settleExplanation = async (result) => {
+    let ticket = { status: "pending" };
+    while (ticket.status === "pending") {
+      const response = await axios.get(`http://127.0.0.1:5000/explanation/${result.ticket_id}?wait=30`);
+      ticket = response.data;
+    }
+    const settled = ticket.status === "done"
+      ? { ...result, ...ticket.result, explanation_status: "done" }
+      : { ...result, gpt_explanation: null, suggested_patch: null, explanation_status: ticket.status };
+    setDetectionResult((prev) => (prev?.ticket_id === result.ticket_id ? settled : prev));
+  };
+
   useEffect(() => {
     const detectAnomaly = async () => {
       if (!vehicleData || !backendAvailable) return;
       try {
         const response = await axios.post("http://127.0.0.1:5000/detect", vehicleData);
         setDetectionResult(response.data);
+        if (response.data.explanation_status === "pending") {
+          await settleExplanation(response.data);
+        }
       } catch (error) {
         console.error("Auto detection error:", error);
       }
@@ -24,6 +24,7 @@ function Dashboard({ vehicleData, detectionResult }) {
   }
 
   const isThreatDetected = detectionResult?.result === "anomaly";
+  const isExplanationPending = detectionResult?.explanation_status === "pending";
 
   return (
     <Container className="dashboard-container py-4 realtive">
@@ -48,10 +49,22 @@ function Dashboard({ vehicleData, detectionResult }) {
                 <>
                   <FaExclamationTriangle size={50} className="mb-3 text-danger" />
                   <Card.Title className="text-danger fw-bold">🚨 Threat Detected!</Card.Title>
-                  <Card.Text className="mb-2">{detectionResult?.gpt_explanation || "Potential Attack Detected!"}</Card.Text>
-                  <Badge bg="danger" className="gradient-badge px-3 py-2 rounded-pill">
-                    {detectionResult?.suggested_patch || "Apply Patch"}
-                  </Badge>
+                  {isExplanationPending ? (
+                    <>
+                      <Card.Text className="mb-2">
+                        <Spinner animation="border" size="sm" className="me-2" />
+                        Analysing threat...
+                      </Card.Text>
+                      <Badge bg="secondary" className="gradient-badge px-3 py-2 rounded-pill">Patch pending</Badge>
+                    </>
+                  ) : (
+                    <>
+                      <Card.Text className="mb-2">{detectionResult?.gpt_explanation || "Potential Attack Detected!"}</Card.Text>
+                      <Badge bg="danger" className="gradient-badge px-3 py-2 rounded-pill">
+                        {detectionResult?.suggested_patch || "Apply Patch"}
+                      </Badge>
+                    </>
+                  )}
                 </>
               ) : (
                 <>
@@ -37,12 +37,19 @@ function SystemLogs() {
     };
 
     fetchLogs();
-    const interval = setInterval(fetchLogs, 10000); // Auto-refresh every 10 sec
-    return () => clearInterval(interval);
+
+    // Live updates pushed by the backend instead of polling
+    const events = new EventSource("http://127.0.0.1:5000/stream?topics=history");
+    events.addEventListener("history", (event) => {
+      const newLogs = JSON.parse(event.data).reverse();
+      setLogs((prev) => [...newLogs, ...prev].slice(0, 10));
+    });
+    return () => events.close();
   }, []);
 
-  const getBadgeVariant = (anomalyScore) => {
-    if (anomalyScore == -1) return "danger";
+  // is_anomaly comes from the backend thresholds; -1 is the old binary label
+  const getBadgeVariant = (log) => {
+    if (log.is_anomaly == 1 || log.anomaly_score == -1) return "danger";
     return "success";                            // no anomaly
   };
 
@@ -73,8 +80,8 @@ function SystemLogs() {
                 <td>{log.timestamp}</td>
                 <td>{log.vehicle_id}</td>
                 <td>
-                  <Badge bg={getBadgeVariant(log.anomaly_score)}>
-                    {log.anomaly_score}
+                  <Badge bg={getBadgeVariant(log)}>
+                    {Number(log.anomaly_score).toFixed(3)}
                   </Badge>
                 </td>
                 <td>{log.attack}</td>
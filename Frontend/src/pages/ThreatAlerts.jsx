@@ -43,8 +43,14 @@ function ThreatAlerts() {
     };
 
     fetchThreats();
-    const interval = setInterval(fetchThreats, 8000);
-    return () => clearInterval(interval);
+
+    // Live updates pushed by the backend instead of polling
+    const events = new EventSource("http://127.0.0.1:5000/stream?topics=threat");
+    events.addEventListener("threat", (event) => {
+      const newThreats = JSON.parse(event.data).reverse();
+      setThreats((prev) => [...newThreats, ...prev].slice(0, 10));
+    });
+    return () => events.close();
   }, []);
 
   const speakText = async (text) => {